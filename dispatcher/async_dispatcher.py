@@ -0,0 +1,323 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import asyncio
+from collections import deque
+from threading import Event
+from typing import Deque, Dict, List, Optional, Set
+
+from uprotocol.v1.uattributes_pb2 import UAttributes
+from uprotocol.v1.umessage_pb2 import UMessage
+
+from dispatcher.dispatcher import (
+    BYTES_MSG_LENGTH,
+    DISPATCHER_CLOSE_TIMEOUT,
+    FRAMING_DETECTION_TIMEOUT,
+    OUTBOUND_HIGH_WATER_MARK,
+    OVERFLOW_BLOCK,
+    OVERFLOW_DISCONNECT,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_POLICIES,
+    logger,
+    tracer,
+)
+from dispatcher.endpoint import create_server_socket, dispatcher_endpoint, remove_server_socket_file
+from dispatcher.framing import (
+    FRAME_PING,
+    FRAME_PONG,
+    FRAME_REGISTER_LISTENER,
+    FRAME_UMESSAGE,
+    FRAME_UNREGISTER_LISTENER,
+    UpClientStream,
+    encode_frame,
+)
+from dispatcher.routing import UriFilterIndex
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+class AsyncUpClientSession(UpClientStream):
+    """
+    Per-connection state of an up-client served by the AsyncDispatcher.
+    Serialized UMessages are queued as-is and encoded for the connection's wire mode by its writer task.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+        self.peername = writer.get_extra_info("peername")
+        self.wire_mode_known = asyncio.Event()
+        self.outbound: Deque[bytes] = deque()
+        self.outbound_bytes = 0
+        self.outbound_ready = asyncio.Event()
+        self.below_high_water_mark = asyncio.Event()
+        self.below_high_water_mark.set()
+        self.dropped = 0
+        self.reader_task: Optional[asyncio.Task] = None
+        self.writer_task: Optional[asyncio.Task] = None
+
+
+class AsyncDispatcher:
+    """
+    asyncio implementation of the Dispatcher, serving each up-client with its own reader and writer task.
+    It speaks the same wire protocol on the same endpoint, and can either be embedded in a running
+    event loop (start() / aclose()) or run on its own thread like the Dispatcher
+    (listen_for_client_connections() / close()), using uvloop when it is installed.
+
+    With the block overflow policy, only the up-client sending to a slow consumer is paused.
+    """
+
+    def __init__(
+        self,
+        high_water_mark: int = OUTBOUND_HIGH_WATER_MARK,
+        overflow_policy: str = OVERFLOW_DROP_OLDEST,
+        use_uvloop: bool = True,
+        endpoint: Optional[str] = None,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}")
+        self.high_water_mark = high_water_mark
+        self.overflow_policy = overflow_policy
+        self.use_uvloop = use_uvloop and uvloop is not None
+        self.sessions: Dict[AsyncUpClientSession, None] = {}
+        # Legacy up-clients receive every UMessage, and undecided ones queue them until their wire mode is known
+        self.legacy_sessions: Set[AsyncUpClientSession] = set()
+        self.undecided_sessions: Set[AsyncUpClientSession] = set()
+        self.routing_table = UriFilterIndex()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.closed: Optional[asyncio.Event] = None
+        self.event_loop_stopped = Event()
+        self.event_loop_stopped.set()
+
+        # Create server socket, so address errors surface at construction like with the Dispatcher
+        self.endpoint: str = dispatcher_endpoint(endpoint)
+        self.server_socket = create_server_socket(self.endpoint)
+
+    async def start(self):
+        """
+        Start serving up-clients on the running event loop.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.closed = asyncio.Event()
+        self.server = await asyncio.start_server(self._handle_up_client, sock=self.server_socket)
+        logger.info(f"Async dispatcher server is running/listening on {self.endpoint} ({type(self.loop).__module__})")
+
+    async def serve(self):
+        """
+        Serve up-clients until aclose() is called.
+        """
+        await self.start()
+        await self.closed.wait()
+
+    async def aclose(self):
+        """
+        Stop serving and disconnect every up-client.
+        """
+        if self.server is None:
+            return
+        self.server.close()
+        # Closing the connections ends each reader task, which then closes its session
+        reader_tasks: List[asyncio.Task] = [session.reader_task for session in self.sessions]
+        for session in list(self.sessions):
+            session.writer.close()
+        if reader_tasks:
+            await asyncio.wait(reader_tasks, timeout=DISPATCHER_CLOSE_TIMEOUT)
+        await self.server.wait_closed()
+        remove_server_socket_file(self.endpoint)
+        self.server = None
+        self.closed.set()
+        logger.info("Dispatcher closed!")
+
+    def listen_for_client_connections(self):
+        """
+        Run the dispatcher on a new event loop owned by the calling thread, until close() is called.
+        """
+        loop = uvloop.new_event_loop() if self.use_uvloop else asyncio.new_event_loop()
+        self.event_loop_stopped.clear()
+        try:
+            loop.run_until_complete(self.serve())
+        finally:
+            loop.close()
+            self.event_loop_stopped.set()
+
+    def close(self):
+        """
+        Stop a dispatcher running on another thread and wait until its event loop has finished.
+        """
+        if self.loop is not None and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.aclose(), self.loop).result(timeout=DISPATCHER_CLOSE_TIMEOUT)
+        if not self.event_loop_stopped.wait(timeout=DISPATCHER_CLOSE_TIMEOUT):
+            logger.error("Dispatcher event loop did not stop in time")
+
+    async def _handle_up_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Receive frames from an up-client until it disconnects.
+
+        :param reader: The stream the up-client's data is read from.
+        :param writer: The stream data for the up-client is written to.
+        """
+        session = AsyncUpClientSession(reader, writer)
+        session.reader_task = asyncio.current_task()
+        session.writer_task = asyncio.create_task(self._write_to_up_client(session))
+        self.sessions[session] = None
+        self.undecided_sessions.add(session)
+        logger.info(f"accepted conn. {session.peername}")
+
+        try:
+            while True:
+                recv_data: bytes = await reader.read(BYTES_MSG_LENGTH)
+                if recv_data == b"":
+                    break
+
+                tracer.dump("received data: %s", recv_data)
+                for kind, payload in session.receive(recv_data):
+                    if kind == FRAME_UMESSAGE:
+                        await self._forward_to_up_clients(payload)
+                    else:
+                        self._handle_control_frame(session, kind, payload)
+                if session.framed is not None and session in self.undecided_sessions:
+                    self._wire_mode_decided(session)
+        except Exception as e:
+            logger.error(f"Received error while reading data from up-client {session.peername}: {e}")
+        finally:
+            self._close_session(session)
+
+    def _wire_mode_decided(self, session: AsyncUpClientSession):
+        """
+        Move a session out of the undecided ones once its wire mode is known, and let its writer task start.
+
+        :param session: The up-client session whose wire mode was just settled.
+        """
+        self.undecided_sessions.discard(session)
+        if not session.framed:
+            self.legacy_sessions.add(session)
+        session.wire_mode_known.set()
+
+    def _handle_control_frame(self, session: AsyncUpClientSession, kind: int, payload: bytes):
+        """
+        Update the routing table from a listener (un)registration of a framed up-client, or answer its heartbeat.
+
+        :param session: The up-client session that sent the control frame.
+        :param kind: The control frame kind.
+        :param payload: Serialized UAttributes holding the source and sink filters.
+        """
+        if kind == FRAME_PING:
+            # Written right away, as the outbound queue only holds UMessages; frames are never interleaved
+            session.writer.write(encode_frame(b"", FRAME_PONG))
+            return
+        filters = UAttributes()
+        filters.ParseFromString(payload)
+        if kind == FRAME_REGISTER_LISTENER:
+            self.routing_table.add(filters.source, filters.sink, session)
+        elif kind == FRAME_UNREGISTER_LISTENER:
+            self.routing_table.remove(filters.source, filters.sink, session)
+        else:
+            logger.error(f"Unknown frame kind {kind} from {session.peername}")
+
+    def _route(self, data: bytes) -> List[AsyncUpClientSession]:
+        """
+        Select the sessions a serialized UMessage has to be sent to.
+
+        :param data: The serialized UMessage to be sent.
+        :return: Every legacy up-client, and the framed up-clients with a matching listener.
+        """
+        destinations: List[AsyncUpClientSession] = [*self.legacy_sessions, *self.undecided_sessions]
+        if len(self.routing_table) > 0:
+            umsg = UMessage()
+            try:
+                umsg.ParseFromString(data)
+            except Exception:
+                logger.error("Unable to parse UMessage, only forwarding it to legacy up-clients")
+                return destinations
+            destinations.extend(self.routing_table.lookup(umsg.attributes.source, umsg.attributes.sink))
+        return destinations
+
+    async def _forward_to_up_clients(self, data: bytes):
+        """
+        Queue a serialized UMessage for every interested up-client, applying the overflow policy to slow ones.
+
+        :param data: The serialized UMessage to be sent.
+        """
+        for session in self._route(data):
+            session.outbound.append(data)
+            session.outbound_bytes += len(data)
+            session.outbound_ready.set()
+            if session.outbound_bytes <= self.high_water_mark:
+                continue
+
+            if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                while session.outbound and session.outbound_bytes > self.high_water_mark:
+                    session.outbound_bytes -= len(session.outbound.popleft())
+                    session.dropped += 1
+                logger.warning(f"{session.peername} is falling behind, dropped {session.dropped} UMessages so far")
+            elif self.overflow_policy == OVERFLOW_DISCONNECT:
+                logger.warning(f"{session.peername} is falling behind, disconnecting it")
+                self._close_session(session)
+            elif self.overflow_policy == OVERFLOW_BLOCK:
+                session.below_high_water_mark.clear()
+                await session.below_high_water_mark.wait()
+
+    async def _write_to_up_client(self, session: AsyncUpClientSession):
+        """
+        Writer task draining an up-client's outbound queue, encoded for its wire mode.
+
+        :param session: The up-client session.
+        """
+        try:
+            await asyncio.wait_for(session.wire_mode_known.wait(), FRAMING_DETECTION_TIMEOUT)
+        except asyncio.TimeoutError:
+            if session.framed is None and session in self.undecided_sessions:
+                session.framed = False
+                self._wire_mode_decided(session)
+
+        try:
+            while True:
+                await session.outbound_ready.wait()
+                while session.outbound:
+                    data: bytes = session.outbound.popleft()
+                    session.outbound_bytes -= len(data)
+                    session.writer.write(encode_frame(data) if session.framed else data)
+                    if session.outbound_bytes <= self.high_water_mark:
+                        session.below_high_water_mark.set()
+                    await session.writer.drain()
+                session.outbound_ready.clear()
+        except (ConnectionError, OSError) as e:
+            logger.error(f"Error sending data to {session.peername}: {e}")
+            self._close_session(session)
+
+    def _close_session(self, session: AsyncUpClientSession):
+        """
+        Forget an up-client session and close its connection.
+
+        :param session: The up-client session to be closed.
+        """
+        if session not in self.sessions:
+            return
+        logger.info(f"closing socket {session.peername}")
+        del self.sessions[session]
+        self.legacy_sessions.discard(session)
+        self.undecided_sessions.discard(session)
+        self.routing_table.remove_value(session)
+        session.below_high_water_mark.set()
+        if session.writer_task is not None and session.writer_task is not asyncio.current_task():
+            session.writer_task.cancel()
+        session.writer.close()
@@ -18,107 +18,405 @@ SPDX-License-Identifier: Apache-2.0
 import logging
 import selectors
 import socket
-import sys
-from threading import Lock
-from typing import Set
+import time
+from collections import deque
+from threading import Event, Lock
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from uprotocol.v1.uattributes_pb2 import UAttributes
+from uprotocol.v1.umessage_pb2 import UMessage
+
+from dispatcher.endpoint import create_server_socket, dispatcher_endpoint, remove_server_socket_file
+from dispatcher.framing import (
+    FRAME_PING,
+    FRAME_PONG,
+    FRAME_REGISTER_LISTENER,
+    FRAME_UMESSAGE,
+    FRAME_UNREGISTER_LISTENER,
+    UpClientStream,
+    encode_frame,
+)
+from dispatcher.routing import UriFilterIndex
+from dispatcher.tracing import Tracer
 
 logging.basicConfig(format="%(levelname)s| %(filename)s:%(lineno)s %(message)s")
 logger = logging.getLogger("File:Line# Debugger")
 logger.setLevel(logging.DEBUG)
-DISPATCHER_ADDR = ("127.0.0.1", 44444)
+tracer = Tracer("dispatcher")
 BYTES_MSG_LENGTH: int = 32767
+# Up-clients silent for this many seconds after connecting use the legacy wire mode, and receive the UMessages
+# held back until then
+FRAMING_DETECTION_TIMEOUT: float = 0.5
+DISPATCHER_CLOSE_TIMEOUT: float = 5.0
+OUTBOUND_HIGH_WATER_MARK: int = 8 * 1024 * 1024
+
+# What to do when an up-client falls behind and its outbound queue exceeds the high-water mark
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DISCONNECT = "disconnect"
+OVERFLOW_BLOCK = "block"
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DISCONNECT, OVERFLOW_BLOCK)
+
+
+class UpClientConnection(UpClientStream):
+    """
+    Per-connection state of an up-client.
+    Its wire mode is assumed to be legacy once FRAMING_DETECTION_TIMEOUT passes without any data received,
+    and UMessages to be sent to an undecided connection are held back until then.
+    Outgoing data is queued and written without blocking, as far as the up-client keeps up.
+    """
+
+    def __init__(self, up_client_socket: socket.socket):
+        super().__init__()
+        self.socket = up_client_socket
+        self.peername = up_client_socket.getpeername()
+        self.detection_deadline: float = time.monotonic() + FRAMING_DETECTION_TIMEOUT
+        self.pending: List[bytes] = []
+        self.outbound: Deque[bytes] = deque()
+        self.outbound_bytes = 0
+        self.head_sent = 0
+        self.dropped = 0
+
+    def queue(self, data: bytes):
+        """
+        Appends an encoded UMessage to the outbound queue.
+        """
+        self.outbound.append(data)
+        self.outbound_bytes += len(data)
+
+    def write(self) -> bool:
+        """
+        Writes queued data until the queue is drained or the socket would block.
+
+        :return: True if the outbound queue is drained.
+        """
+        while self.outbound:
+            head: bytes = self.outbound[0]
+            try:
+                sent: int = self.socket.send(memoryview(head)[self.head_sent :])
+            except BlockingIOError:
+                return False
+            self.head_sent += sent
+            self.outbound_bytes -= sent
+            if self.head_sent < len(head):
+                return False
+            self.outbound.popleft()
+            self.head_sent = 0
+        return True
+
+    def drop_oldest(self, high_water_mark: int):
+        """
+        Discards the oldest queued UMessages until the queue is back under the high-water mark.
+        A partially written UMessage is kept, so the byte stream stays intact.
+        """
+        keep_head: Optional[bytes] = self.outbound.popleft() if self.head_sent else None
+        while self.outbound and self.outbound_bytes > high_water_mark:
+            self.outbound_bytes -= len(self.outbound.popleft())
+            self.dropped += 1
+        if keep_head is not None:
+            self.outbound.appendleft(keep_head)
 
 
 class Dispatcher:
     """
-    Dispatcher class handles incoming connections and forwards messages
-    to all connected up-clients.
+    Dispatcher class handles incoming connections and forwards messages to the up-clients interested in them.
+    Framed up-clients announce their listener filters with control frames and only receive matching messages,
+    legacy up-clients receive every message.
+
+    Each up-client has its own outbound queue, so one slow consumer does not stall delivery to the others.
+    Once a queue grows beyond the high-water mark, the overflow policy either drops its oldest UMessages,
+    disconnects the up-client or blocks until it catches up.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        high_water_mark: int = OUTBOUND_HIGH_WATER_MARK,
+        overflow_policy: str = OVERFLOW_DROP_OLDEST,
+        reuse_port: bool = False,
+        endpoint: Optional[str] = None,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}")
+        self.high_water_mark = high_water_mark
+        self.overflow_policy = overflow_policy
         self.selector = selectors.DefaultSelector()
-        self.connected_sockets: Set[socket.socket] = set()
+        self.connected_sockets: Dict[socket.socket, UpClientConnection] = {}
+        # Legacy up-clients receive every UMessage, and undecided ones hold them back until their wire mode is known.
+        # Undecided connections are kept in accept order, which is also the order of their detection deadlines.
+        self.legacy_connections: Set[socket.socket] = set()
+        self.undecided_connections: Dict[socket.socket, UpClientConnection] = {}
+        self.routing_table = UriFilterIndex()
         self.lock = Lock()
         self.server = None
 
-        # Create server socket
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        if sys.platform != "win32":
-            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server.bind(DISPATCHER_ADDR)
-        self.server.listen(100)
-        self.server.setblocking(False)
+        # Create server socket, on the UP_DISPATCHER_ENDPOINT (or default TCP) endpoint unless one is given
+        self.endpoint: str = dispatcher_endpoint(endpoint)
+        self.server = create_server_socket(self.endpoint, reuse_port)
 
-        logger.info("Dispatcher server is running/listening")
+        logger.info(f"Dispatcher server is running/listening on {self.endpoint}")
 
         # Register server socket for accepting connections
         self.selector.register(self.server, selectors.EVENT_READ, self._accept_client_conn)
 
+        # Wake-up channel, so close() can interrupt a select() that blocks without timeout
+        self.wakeup_receiver, self.wakeup_sender = socket.socketpair()
+        self.wakeup_receiver.setblocking(False)
+        self.selector.register(self.wakeup_receiver, selectors.EVENT_READ, self._drain_wakeup)
+
         # Cleanup essentials
         self.dispatcher_exit = False
+        self.event_loop_stopped = Event()
+        self.event_loop_stopped.set()
 
-    def _accept_client_conn(self, server: socket.socket):
+    def _accept_client_conn(self, server: socket.socket, mask: int):
         """
         Callback function for accepting up-client connections.
 
         :param server: The server socket.
+        :param mask: The selector events that are ready.
         """
 
         up_client_socket, _ = server.accept()
+        up_client_socket.setblocking(False)
         logger.info(f"accepted conn. {up_client_socket.getpeername()}")
 
         with self.lock:
-            self.connected_sockets.add(up_client_socket)
+            connection = UpClientConnection(up_client_socket)
+            self.connected_sockets[up_client_socket] = connection
+        self.undecided_connections[up_client_socket] = connection
 
         # Register socket for receiving data
         self.selector.register(
             up_client_socket,
             selectors.EVENT_READ,
-            self._receive_from_up_client,
+            self._handle_up_client_event,
         )
 
+    def _handle_up_client_event(self, up_client_socket: socket.socket, mask: int):
+        """
+        Callback function for up-client sockets that are readable or, with queued data, writable.
+
+        :param up_client_socket: The client socket.
+        :param mask: The selector events that are ready.
+        """
+        if mask & selectors.EVENT_WRITE:
+            connection: UpClientConnection = self.connected_sockets.get(up_client_socket)
+            if connection is not None:
+                self._write_to_up_client(connection)
+        if mask & selectors.EVENT_READ and up_client_socket in self.connected_sockets:
+            self._receive_from_up_client(up_client_socket)
+
     def _receive_from_up_client(self, up_client_socket: socket.socket):
         """
-        Callback function for receiving data from up-client sockets.
+        Receive data from an up-client socket.
 
         :param up_client_socket: The client socket.
         """
         try:
-            recv_data: bytes = up_client_socket.recv(BYTES_MSG_LENGTH)
+            try:
+                recv_data: bytes = up_client_socket.recv(BYTES_MSG_LENGTH)
+            except BlockingIOError:
+                return
 
             if recv_data == b"":
                 self._close_connected_socket(up_client_socket)
                 return
 
-            logger.info(f"received data: {recv_data}")
-            self._flood_to_sockets(recv_data)
+            tracer.dump("received data: %s", recv_data)
+            connection: UpClientConnection = self.connected_sockets[up_client_socket]
+            frames: List[Tuple[int, bytes]] = connection.receive(recv_data)
+            if connection.framed is not None and up_client_socket in self.undecided_connections:
+                self._wire_mode_decided(connection)
+            for kind, payload in frames:
+                if kind == FRAME_UMESSAGE:
+                    self._forward_to_sockets(payload, up_client_socket)
+                else:
+                    self._handle_control_frame(up_client_socket, kind, payload)
         except Exception:
             logger.error("Received error while reading data from up-client")
             self._close_connected_socket(up_client_socket)
 
-    def _flood_to_sockets(self, data: bytes):
+    def _handle_control_frame(self, up_client_socket: socket.socket, kind: int, payload: bytes):
         """
-        Flood data from a sender socket to all other connected sockets.
+        Update the routing table from a listener (un)registration of a framed up-client, or answer its heartbeat.
 
-        :param data: The data to be sent.
+        :param up_client_socket: The client socket that sent the control frame.
+        :param kind: The control frame kind.
+        :param payload: Serialized UAttributes holding the source and sink filters.
         """
-        # for up_client_socket in self.connected_sockets.copy():  # copy() to avoid RuntimeError
-        for up_client_socket in self.connected_sockets:
+        if kind == FRAME_PING:
+            self._send_to_up_client(self.connected_sockets[up_client_socket], encode_frame(b"", FRAME_PONG))
+            return
+        filters = UAttributes()
+        filters.ParseFromString(payload)
+        if kind == FRAME_REGISTER_LISTENER:
+            self.routing_table.add(filters.source, filters.sink, up_client_socket)
+        elif kind == FRAME_UNREGISTER_LISTENER:
+            self.routing_table.remove(filters.source, filters.sink, up_client_socket)
+        else:
+            logger.error(f"Unknown frame kind {kind} from {up_client_socket.getpeername()}")
+
+    def _route(self, data: bytes, sender: socket.socket) -> List[socket.socket]:
+        """
+        Select the sockets a serialized UMessage has to be sent to.
+
+        :param data: The serialized UMessage to be sent.
+        :param sender: The socket the UMessage was received from. Not used to route between up-clients, which
+        receive their own UMessages if they listen to them, but by subclasses routing between dispatchers,
+        such as the sharded dispatcher not sending UMessages received from a peer shard back to the peer shards.
+        :return: Every legacy up-client, and the framed up-clients with a matching listener.
+        """
+        destinations: List[socket.socket] = [*self.legacy_connections, *self.undecided_connections]
+        if len(self.routing_table) > 0:
+            umsg = UMessage()
             try:
-                up_client_socket.sendall(data)
-            except ConnectionAbortedError as e:
-                logger.error(f"Error sending data to {up_client_socket.getpeername()}: {e}")
-                self._close_connected_socket(up_client_socket)
+                umsg.ParseFromString(data)
+            except Exception:
+                logger.error("Unable to parse UMessage, only forwarding it to legacy up-clients")
+                return destinations
+            destinations.extend(self.routing_table.lookup(umsg.attributes.source, umsg.attributes.sink))
+        return destinations
+
+    def _forward_to_sockets(self, data: bytes, sender: socket.socket):
+        """
+        Forward a serialized UMessage from a sender socket to the interested connected sockets.
+        Framed up-clients receive it length-prefixed, legacy up-clients receive the raw bytes.
+
+        :param data: The serialized UMessage to be sent.
+        :param sender: The socket the UMessage was received from.
+        """
+        frame: bytes = encode_frame(data)
+        for up_client_socket in self._route(data, sender):
+            connection: UpClientConnection = self.connected_sockets.get(up_client_socket)
+            if connection is None:
+                continue
+            if connection.framed is None:
+                connection.pending.append(data)
+                continue
+            self._send_to_up_client(connection, frame if connection.framed else data)
+
+    def _send_to_up_client(self, connection: UpClientConnection, data: bytes):
+        """
+        Queue encoded data for an up-client and write as much of it as possible without blocking.
+        Applies the overflow policy if the up-client falls behind.
+
+        :param connection: The destination up-client connection.
+        :param data: The encoded UMessage.
+        """
+        connection.queue(data)
+        if len(connection.outbound) == 1 and not self._write_to_up_client(connection):
+            return
+        if connection.outbound_bytes <= self.high_water_mark:
+            return
+
+        peername = connection.peername
+        if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+            connection.drop_oldest(self.high_water_mark)
+            logger.warning(f"{peername} is falling behind, dropped {connection.dropped} UMessages so far")
+        elif self.overflow_policy == OVERFLOW_DISCONNECT:
+            logger.warning(f"{peername} is falling behind, disconnecting it")
+            self._close_connected_socket(connection.socket)
+        else:
+            logger.warning(f"{peername} is falling behind, blocking until it catches up")
+            connection.socket.setblocking(True)
+            try:
+                while connection.outbound_bytes > self.high_water_mark:
+                    connection.write()
+            except OSError as e:
+                logger.error(f"Error sending data to {peername}: {e}")
+                self._close_connected_socket(connection.socket)
+                return
+            connection.socket.setblocking(False)
+
+    def _write_to_up_client(self, connection: UpClientConnection) -> bool:
+        """
+        Write queued data to an up-client, watching its socket for writability while data remains queued.
+
+        :param connection: The up-client connection.
+        :return: False if the up-client was disconnected because of a send error.
+        """
+        try:
+            drained: bool = connection.write()
+        except OSError as e:
+            logger.error(f"Error sending data to {connection.peername}: {e}")
+            self._close_connected_socket(connection.socket)
+            return False
+
+        events: int = selectors.EVENT_READ if drained else selectors.EVENT_READ | selectors.EVENT_WRITE
+        if self.selector.get_key(connection.socket).events != events:
+            self.selector.modify(connection.socket, events, self._handle_up_client_event)
+        return True
+
+    def _wire_mode_decided(self, connection: UpClientConnection):
+        """
+        Move a connection out of the undecided ones once its wire mode is known, and send it the UMessages held back.
+
+        :param connection: The up-client connection whose wire mode was just settled.
+        """
+        del self.undecided_connections[connection.socket]
+        if not connection.framed:
+            self.legacy_connections.add(connection.socket)
+        self._flush_pending(connection)
+
+    def _flush_pending(self, connection: UpClientConnection):
+        """
+        Send the UMessages held back while the connection's wire mode was undecided.
+
+        :param connection: The up-client connection whose wire mode was just settled.
+        """
+        pending, connection.pending = connection.pending, []
+        for data in pending:
+            if connection.socket not in self.connected_sockets:
+                return
+            self._send_to_up_client(connection, encode_frame(data) if connection.framed else data)
+
+    def _expire_framing_detection(self):
+        """
+        Treat up-clients that stayed silent past FRAMING_DETECTION_TIMEOUT as legacy connections.
+        """
+        now: float = time.monotonic()
+        while self.undecided_connections:
+            connection: UpClientConnection = next(iter(self.undecided_connections.values()))
+            if connection.detection_deadline > now:
+                return
+            connection.framed = False
+            self._wire_mode_decided(connection)
+
+    def _drain_wakeup(self, wakeup_receiver: socket.socket, mask: int):
+        """
+        Callback function for discarding the wake-up bytes sent by close().
+
+        :param wakeup_receiver: The receiving end of the wake-up channel.
+        :param mask: The selector events that are ready.
+        """
+        try:
+            wakeup_receiver.recv(BYTES_MSG_LENGTH)
+        except BlockingIOError:
+            pass
+
+    def _select_timeout(self) -> Optional[float]:
+        """
+        Time until the earliest framing detection deadline, or None to block until the next event.
+        """
+        if not self.undecided_connections:
+            return None
+        connection: UpClientConnection = next(iter(self.undecided_connections.values()))
+        return max(0.0, connection.detection_deadline - time.monotonic())
 
     def listen_for_client_connections(self):
         """
         Start listening for client connections and handle events.
+        Blocks in select() while the bus is idle, until close() wakes it up.
         """
-        while not self.dispatcher_exit:
-            events = self.selector.select(timeout=0)
-            for key, _ in events:
-                callback = key.data
-                callback(key.fileobj)
+        self.event_loop_stopped.clear()
+        try:
+            while not self.dispatcher_exit:
+                events = self.selector.select(timeout=self._select_timeout())
+                for key, mask in events:
+                    callback = key.data
+                    callback(key.fileobj, mask)
+                self._expire_framing_detection()
+        finally:
+            self.event_loop_stopped.set()
 
     def _close_connected_socket(self, up_client_socket: socket.socket):
         """
@@ -126,25 +424,39 @@ class Dispatcher:
 
         :param up_client_socket: The client socket to be closed.
         """
-        logger.info(f"closing socket {up_client_socket.getpeername()}")
+        if up_client_socket not in self.connected_sockets:
+            return
         with self.lock:
-            self.connected_sockets.remove(up_client_socket)
+            connection: UpClientConnection = self.connected_sockets.pop(up_client_socket)
+        self.legacy_connections.discard(up_client_socket)
+        self.undecided_connections.pop(up_client_socket, None)
+        logger.info(f"closing socket {connection.peername}")
+        self.routing_table.remove_value(up_client_socket)
 
         self.selector.unregister(up_client_socket)
         up_client_socket.close()
 
     def close(self):
         self.dispatcher_exit = True
-        for utransport_socket in self.connected_sockets.copy():
+        self.wakeup_sender.send(b"\0")
+        # Let the event loop finish its current iteration before closing the sockets it waits on
+        if not self.event_loop_stopped.wait(timeout=DISPATCHER_CLOSE_TIMEOUT):
+            logger.error("Dispatcher event loop did not stop in time")
+
+        for utransport_socket in list(self.connected_sockets):
             self._close_connected_socket(utransport_socket)
         # Close server socket
         try:
             self.selector.unregister(self.server)
             self.server.close()
+            remove_server_socket_file(self.endpoint)
             logger.info("Server socket closed!")
         except Exception as e:
             logger.error(f"Error closing server socket: {e}")
 
-        # Close selector
+        # Close wake-up channel and selector
+        self.selector.unregister(self.wakeup_receiver)
+        self.wakeup_receiver.close()
+        self.wakeup_sender.close()
         self.selector.close()
         logger.info("Dispatcher closed!")
@@ -0,0 +1,170 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import os
+import socket
+import stat
+import sys
+from typing import Optional, Tuple, Union
+
+# Endpoint the dispatcher listens on and up-clients connect to, as a URI:
+#   tcp://<host>:<port>   TCP socket (default)
+#   unix:///<path>        Unix domain socket bound to a file system path
+#   unix://@<name>        Linux abstract namespace Unix domain socket
+DISPATCHER_ENDPOINT_ENV = "UP_DISPATCHER_ENDPOINT"
+DEFAULT_DISPATCHER_ENDPOINT = "tcp://127.0.0.1:44444"
+
+# TCP keepalive probing of idle connections, in seconds and probes
+KEEPALIVE_IDLE: int = 10
+KEEPALIVE_INTERVAL: int = 5
+KEEPALIVE_COUNT: int = 3
+
+TCP_SCHEME = "tcp://"
+UNIX_SCHEME = "unix://"
+
+Address = Union[Tuple[str, int], str]
+
+
+def dispatcher_endpoint(endpoint: Optional[str] = None) -> str:
+    """
+    Resolves the dispatcher endpoint: the given one, else the UP_DISPATCHER_ENDPOINT environment variable,
+    else the default TCP endpoint.
+
+    :param endpoint: An explicit endpoint URI, or None.
+    :return: The endpoint URI to use.
+    """
+    return endpoint or os.environ.get(DISPATCHER_ENDPOINT_ENV) or DEFAULT_DISPATCHER_ENDPOINT
+
+
+def parse_endpoint(endpoint: str) -> Tuple[int, Address]:
+    """
+    Parses an endpoint URI into a socket address family and address.
+
+    :param endpoint: The endpoint URI.
+    :return: (socket.AF_INET, (host, port)) or (socket.AF_UNIX, path). Abstract names start with a NUL byte.
+    """
+    if endpoint.startswith(TCP_SCHEME):
+        host, separator, port = endpoint[len(TCP_SCHEME) :].rpartition(":")
+        if not separator or not host or not port.isdigit():
+            raise ValueError(f"Invalid TCP endpoint {endpoint}, expected tcp://<host>:<port>")
+        return socket.AF_INET, (host, int(port))
+
+    if endpoint.startswith(UNIX_SCHEME):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError(f"Unix domain sockets are not supported on {sys.platform}")
+        path: str = endpoint[len(UNIX_SCHEME) :]
+        if path.startswith("@"):
+            if not sys.platform.startswith("linux"):
+                raise ValueError("Abstract namespace Unix domain sockets are only available on Linux")
+            if len(path) == 1:
+                raise ValueError(f"Invalid abstract Unix endpoint {endpoint}, expected unix://@<name>")
+            return socket.AF_UNIX, "\0" + path[1:]
+        if not path:
+            raise ValueError(f"Invalid Unix endpoint {endpoint}, expected unix:///<path>")
+        return socket.AF_UNIX, path
+
+    raise ValueError(f"Unsupported endpoint {endpoint}, expected a tcp:// or unix:// URI")
+
+
+def is_unix_path(family: int, address: Address) -> bool:
+    """
+    Checks whether an address is a Unix domain socket bound to a file system path.
+    """
+    return family != socket.AF_INET and not address.startswith("\0")
+
+
+def create_server_socket(endpoint: str, reuse_port: bool = False) -> socket.socket:
+    """
+    Creates a non-blocking listening socket for an endpoint.
+    A stale socket file left behind at a Unix endpoint's path is replaced.
+
+    :param endpoint: The endpoint URI.
+    :param reuse_port: Whether to set SO_REUSEPORT, only supported on TCP endpoints.
+    :return: The listening socket.
+    """
+    family, address = parse_endpoint(endpoint)
+    server = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        if family == socket.AF_INET:
+            if sys.platform != "win32":
+                server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                # Lets several dispatcher processes listen on the same address, the kernel balancing connections
+                server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        elif reuse_port:
+            raise ValueError("SO_REUSEPORT is only supported on TCP endpoints")
+        elif is_unix_path(family, address) and os.path.exists(address):
+            if not stat.S_ISSOCK(os.stat(address).st_mode):
+                raise ValueError(f"{address} exists and is not a socket")
+            os.unlink(address)
+        server.bind(address)
+        server.listen(100)
+        server.setblocking(False)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def remove_server_socket_file(endpoint: str):
+    """
+    Removes the socket file a listening socket created for a Unix endpoint bound to a path.
+
+    :param endpoint: The endpoint URI.
+    """
+    family, address = parse_endpoint(endpoint)
+    if is_unix_path(family, address):
+        try:
+            os.unlink(address)
+        except FileNotFoundError:
+            pass
+
+
+def connect_to_endpoint(endpoint: str) -> socket.socket:
+    """
+    Creates a blocking socket connected to an endpoint.
+
+    :param endpoint: The endpoint URI.
+    :return: The connected socket.
+    """
+    family, address = parse_endpoint(endpoint)
+    client = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        client.connect(address)
+    except Exception:
+        client.close()
+        raise
+    return client
+
+
+def enable_keepalive(sock: socket.socket):
+    """
+    Enables TCP keepalive on a TCP socket, with the probing intervals tuned where the platform allows it.
+    Unix domain sockets are left untouched.
+
+    :param sock: The connected socket.
+    """
+    if sock.family != socket.AF_INET:
+        return
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (
+        ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+        ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+        ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+    ):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
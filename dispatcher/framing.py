@@ -0,0 +1,217 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import socket
+import struct
+from typing import Iterator, List, Optional, Tuple
+
+# Preamble a framing-aware up-client sends right after connecting to the dispatcher.
+# The leading NUL byte can never start a serialized UMessage (protobuf field number 0 is invalid),
+# so the dispatcher can tell framed and legacy (one recv == one UMessage) connections apart.
+FRAMING_PREAMBLE: bytes = b"\x00UPF"
+
+# Every frame is a 4-byte big-endian payload length and a 1-byte frame kind, followed by the payload.
+FRAME_HEADER = struct.Struct("!IB")
+FRAME_UMESSAGE: int = 0
+# Control frames announcing an up-client's listener filters, so the dispatcher only routes matching UMessages to it.
+# The payload is a serialized UAttributes carrying just the source and sink filters.
+FRAME_REGISTER_LISTENER: int = 1
+FRAME_UNREGISTER_LISTENER: int = 2
+# Heartbeat frames with an empty payload: the dispatcher answers every ping with a pong,
+# so an up-client can detect a half-open link to the dispatcher.
+FRAME_PING: int = 3
+FRAME_PONG: int = 4
+
+MAX_FRAME_LENGTH: int = 16 * 1024 * 1024
+RECEIVE_BUFFER_SIZE: int = 64 * 1024
+
+
+class FramingError(Exception):
+    """
+    Raised when a framed byte stream cannot be decoded.
+    """
+
+
+def encode_frame(payload: bytes, kind: int = FRAME_UMESSAGE) -> bytes:
+    """
+    Prefixes the payload with its frame header.
+
+    :param payload: The frame payload, e.g. a serialized UMessage.
+    :param kind: The frame kind.
+    :return: The encoded frame.
+    """
+    return FRAME_HEADER.pack(len(payload), kind) + payload
+
+
+class FrameDecoder:
+    """
+    Reassembles frames from the arbitrary chunks a stream socket delivers.
+    One decoder is kept per connection, as partial frames are buffered between reads.
+    """
+
+    def __init__(self, max_frame_length: int = MAX_FRAME_LENGTH):
+        self.max_frame_length = max_frame_length
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        """
+        Appends received data and returns every frame completed by it.
+
+        :param data: The bytes received from the socket.
+        :return: A list of (frame kind, payload) tuples, in stream order.
+        """
+        self.buffer += data
+
+        frames: List[Tuple[int, bytes]] = []
+        offset = 0
+        buffered = len(self.buffer)
+        while buffered - offset >= FRAME_HEADER.size:
+            length, kind = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if length > self.max_frame_length:
+                raise FramingError(f"Frame of {length} bytes exceeds limit of {self.max_frame_length} bytes")
+
+            end = offset + FRAME_HEADER.size + length
+            if end > buffered:
+                break
+            frames.append((kind, bytes(self.buffer[offset + FRAME_HEADER.size : end])))
+            offset = end
+
+        if offset:
+            del self.buffer[:offset]
+        return frames
+
+
+class UpClientStream:
+    """
+    Decoding state of the byte stream received from an up-client.
+    Whether the up-client speaks the framed wire mode is only known once its first bytes arrive.
+    """
+
+    def __init__(self):
+        self.framed: Optional[bool] = None
+        self.received_data = False
+        self.decoder = FrameDecoder()
+
+    def receive(self, recv_data: bytes) -> List[Tuple[int, bytes]]:
+        """
+        Extracts the frames contained in newly received data.
+
+        :param recv_data: The bytes received from the up-client.
+        :return: A list of (frame kind, payload) tuples, in stream order.
+        """
+        if not self.received_data:
+            self.decoder.buffer += recv_data
+            if self.decoder.buffer[:1] != FRAMING_PREAMBLE[:1]:
+                # Legacy up-client: every recv is treated as exactly one UMessage
+                self.received_data = True
+                self.framed = False
+                recv_data = bytes(self.decoder.buffer)
+                self.decoder.buffer.clear()
+            elif len(self.decoder.buffer) < len(FRAMING_PREAMBLE):
+                return []
+            elif not self.decoder.buffer.startswith(FRAMING_PREAMBLE):
+                raise FramingError("Invalid framing preamble")
+            else:
+                self.received_data = True
+                self.framed = True
+                del self.decoder.buffer[: len(FRAMING_PREAMBLE)]
+                recv_data = b""
+
+        if not self.framed:
+            return [(FRAME_UMESSAGE, recv_data)]
+        return self.decoder.feed(recv_data)
+
+
+class ReceiveBuffer:
+    """
+    Preallocated buffer a stream socket is read into with recv_into(), and frames are parsed from in place.
+    Payloads are handed out as memoryview slices of the buffer, which are only valid until the next receive.
+    The buffer only grows for frames larger than its capacity, and shrinks back once they are consumed.
+    """
+
+    def __init__(self, capacity: int = RECEIVE_BUFFER_SIZE, max_frame_length: int = MAX_FRAME_LENGTH):
+        self.capacity = capacity
+        self.max_frame_length = max_frame_length
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        # Size of the frame partially received at the start of the unconsumed data
+        self.pending_frame_size = 0
+
+    def recv_into(self, sock: socket.socket) -> int:
+        """
+        Receives data from a socket after the unconsumed data.
+
+        :param sock: The socket to receive from.
+        :return: The number of bytes received, 0 once the peer closed the connection.
+        """
+        self._make_room()
+        received: int = sock.recv_into(self.view[self.end :])
+        self.end += received
+        return received
+
+    def take(self) -> memoryview:
+        """
+        Consumes all the unconsumed data, for byte streams without framing.
+        """
+        data: memoryview = self.view[self.start : self.end]
+        self.start = self.end
+        return data
+
+    def frames(self) -> Iterator[Tuple[int, memoryview]]:
+        """
+        Consumes the complete frames of the unconsumed data.
+
+        :return: An iterator of (frame kind, payload) tuples, in stream order.
+        """
+        self.pending_frame_size = 0
+        while self.end - self.start >= FRAME_HEADER.size:
+            length, kind = FRAME_HEADER.unpack_from(self.buffer, self.start)
+            if length > self.max_frame_length:
+                raise FramingError(f"Frame of {length} bytes exceeds limit of {self.max_frame_length} bytes")
+            frame_end: int = self.start + FRAME_HEADER.size + length
+            if frame_end > self.end:
+                self.pending_frame_size = FRAME_HEADER.size + length
+                return
+            payload: memoryview = self.view[self.start + FRAME_HEADER.size : frame_end]
+            self.start = frame_end
+            yield kind, payload
+
+    def _make_room(self):
+        """
+        Moves the unconsumed data to the start of the buffer, growing it for an oversized partial frame
+        and shrinking it back to its capacity once empty.
+        """
+        unconsumed: int = self.end - self.start
+        if unconsumed == 0 and len(self.buffer) > self.capacity:
+            self._reallocate(self.capacity)
+        elif self.pending_frame_size > len(self.buffer):
+            self._reallocate(self.pending_frame_size)
+        elif self.start and (self.end == len(self.buffer) or self.pending_frame_size > len(self.buffer) - self.start):
+            self.buffer[:unconsumed] = self.buffer[self.start : self.end]
+            self.start, self.end = 0, unconsumed
+        elif unconsumed == 0:
+            self.start = self.end = 0
+
+    def _reallocate(self, size: int):
+        unconsumed: int = self.end - self.start
+        buffer = bytearray(size)
+        buffer[:unconsumed] = self.view[self.start : self.end]
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.start, self.end = 0, unconsumed
@@ -0,0 +1,145 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from uprotocol.uri.factory.uri_factory import UriFactory
+from uprotocol.uri.validator.urivalidator import UriValidator
+from uprotocol.v1.uri_pb2 import UUri
+
+# (authority_name, ue_id entity part, resource_id); None stands for a wildcard component
+BucketKey = Tuple[Optional[str], Optional[int], Optional[int]]
+UriKey = Tuple[str, int, int, int]
+
+
+def uri_key(uri: UUri) -> UriKey:
+    """
+    Hashable identity of a UUri.
+    """
+    return (uri.authority_name, uri.ue_id, uri.ue_version_major, uri.resource_id)
+
+
+def filter_matches(source_filter: UUri, sink_filter: UUri, source: UUri, sink: UUri) -> bool:
+    """
+    Checks whether a message with the given source and sink is matched by a source/sink filter pair.
+    A filter that is UriFactory.ANY on one side only matches on the other side.
+    """
+    if source_filter == UriFactory.ANY:
+        return UriValidator.matches(sink_filter, sink)
+    elif sink_filter == UriFactory.ANY:
+        return UriValidator.matches(source_filter, source)
+    else:
+        return UriValidator.matches(source_filter, source) and UriValidator.matches(sink_filter, sink)
+
+
+def _bucket_key(uri_filter: UUri) -> BucketKey:
+    authority = None if uri_filter.authority_name == UriFactory.WILDCARD_AUTHORITY else uri_filter.authority_name
+    entity_id = uri_filter.ue_id & UriFactory.WILDCARD_ENTITY_ID
+    entity = None if entity_id == UriFactory.WILDCARD_ENTITY_ID else entity_id
+    resource = None if uri_filter.resource_id == UriFactory.WILDCARD_RESOURCE_ID else uri_filter.resource_id
+    return (authority, entity, resource)
+
+
+def _candidate_bucket_keys(uri: UUri) -> List[BucketKey]:
+    entity_id = uri.ue_id & UriFactory.WILDCARD_ENTITY_ID
+    return [
+        (authority, entity, resource)
+        for authority in (uri.authority_name, None)
+        for entity in (entity_id, None)
+        for resource in (uri.resource_id, None)
+    ]
+
+
+class UriFilterIndex:
+    """
+    Index of values (listeners, connections, ...) registered for source/sink filter pairs.
+
+    Each pair is bucketed once, on the authority, entity and resource of the filter side that decides the match,
+    with wildcard components bucketed as None. A lookup probes the eight buckets a concrete UUri can fall into
+    and verifies the few candidates found, so its cost depends on the number of matching registrations
+    rather than on the total number of registrations.
+    """
+
+    def __init__(self):
+        self.by_source: Dict[BucketKey, Dict[Hashable, Tuple[UUri, UUri, Any]]] = {}
+        self.by_sink: Dict[BucketKey, Dict[Hashable, Tuple[UUri, UUri, Any]]] = {}
+        self.entry_count = 0
+
+    def _buckets_of(self, source_filter: UUri, sink_filter: UUri) -> Tuple[Dict, BucketKey]:
+        if source_filter == UriFactory.ANY:
+            return self.by_sink, _bucket_key(sink_filter)
+        return self.by_source, _bucket_key(source_filter)
+
+    def add(self, source_filter: UUri, sink_filter: UUri, value: Hashable):
+        """
+        Registers a value for a source/sink filter pair.
+        Adding the same value for the same pair again has no effect.
+        """
+        buckets, bucket_key = self._buckets_of(source_filter, sink_filter)
+        bucket = buckets.setdefault(bucket_key, {})
+        entry_key = (uri_key(source_filter), uri_key(sink_filter), value)
+        if entry_key not in bucket:
+            self.entry_count += 1
+        bucket[entry_key] = (source_filter, sink_filter, value)
+
+    def remove(self, source_filter: UUri, sink_filter: UUri, value: Hashable) -> bool:
+        """
+        Unregisters a value from a source/sink filter pair.
+
+        :return: True if the value was registered for the pair.
+        """
+        buckets, bucket_key = self._buckets_of(source_filter, sink_filter)
+        bucket = buckets.get(bucket_key)
+        if bucket is None or bucket.pop((uri_key(source_filter), uri_key(sink_filter), value), None) is None:
+            return False
+        if not bucket:
+            del buckets[bucket_key]
+        self.entry_count -= 1
+        return True
+
+    def remove_value(self, value: Hashable):
+        """
+        Unregisters a value from every filter pair it was registered for.
+        """
+        for buckets in (self.by_source, self.by_sink):
+            for bucket_key, bucket in list(buckets.items()):
+                for entry_key in [entry_key for entry_key in bucket if entry_key[2] == value]:
+                    del bucket[entry_key]
+                    self.entry_count -= 1
+                if not bucket:
+                    del buckets[bucket_key]
+
+    def lookup(self, source: UUri, sink: UUri) -> List[Any]:
+        """
+        Returns the values whose filter pairs match a message with the given source and sink.
+        A value registered for several matching pairs is returned once.
+        """
+        matched: Dict[Any, None] = {}
+        for buckets, uri in ((self.by_source, source), (self.by_sink, sink)):
+            if not buckets:
+                continue
+            for bucket_key in _candidate_bucket_keys(uri):
+                bucket = buckets.get(bucket_key)
+                if not bucket:
+                    continue
+                for source_filter, sink_filter, value in bucket.values():
+                    if value not in matched and filter_matches(source_filter, sink_filter, source, sink):
+                        matched[value] = None
+        return list(matched)
+
+    def __len__(self) -> int:
+        return self.entry_count
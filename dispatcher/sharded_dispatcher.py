@@ -0,0 +1,242 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+import time
+from threading import Event, Thread
+from typing import List, Optional
+
+from dispatcher.dispatcher import (
+    DISPATCHER_CLOSE_TIMEOUT,
+    OUTBOUND_HIGH_WATER_MARK,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_POLICIES,
+    Dispatcher,
+    UpClientConnection,
+    logger,
+)
+from dispatcher.endpoint import dispatcher_endpoint, parse_endpoint
+
+# How long the ShardedDispatcher waits for every worker to bind the listening socket
+SHARD_STARTUP_TIMEOUT: float = 30.0
+
+
+class ShardDispatcher(Dispatcher):
+    """
+    Dispatcher running in one worker process of a ShardedDispatcher.
+    Its listening socket shares the dispatcher address with the other shards through SO_REUSEPORT,
+    and it is connected to every other shard by a framed Unix socket pair.
+
+    UMessages received from local up-clients are routed locally and forwarded to every peer shard,
+    UMessages received from a peer shard are only routed to local up-clients.
+    """
+
+    def __init__(self, peer_sockets: List[socket.socket], stop=None, **kwargs):
+        super().__init__(reuse_port=True, **kwargs)
+        # Set when every shard is stopping, so the peer shards closing their links are expected
+        self.stop = stop
+        self.peer_sockets = set()
+        for peer_socket in peer_sockets:
+            peer_socket.setblocking(False)
+            connection = UpClientConnection(peer_socket)
+            # Peer shards always speak the framed wire mode, without a preamble
+            connection.framed = True
+            connection.received_data = True
+            with self.lock:
+                self.connected_sockets[peer_socket] = connection
+            self.peer_sockets.add(peer_socket)
+            self.selector.register(peer_socket, selectors.EVENT_READ, self._handle_up_client_event)
+
+    def _route(self, data: bytes, sender: socket.socket) -> List[socket.socket]:
+        """
+        Select the sockets a serialized UMessage has to be sent to.
+
+        :param data: The serialized UMessage to be sent.
+        :param sender: The socket the UMessage was received from.
+        :return: The interested local up-clients, plus every peer shard if the sender is a local up-client.
+        """
+        # Peer shards are framed and never register listeners, so the local routing never selects them
+        destinations: List[socket.socket] = super()._route(data, sender)
+        if sender not in self.peer_sockets:
+            destinations.extend(self.peer_sockets)
+        return destinations
+
+    def _send_to_up_client(self, connection: UpClientConnection, data: bytes):
+        """
+        Queue encoded data for an up-client or a peer shard and write as much of it as possible without blocking.
+        Peer shards are exempt from the overflow policy, as dropping UMessages or disconnecting would lose them for
+        every up-client of the peer shard, and blocking could deadlock two shards sending to each other:
+        their queue grows past the high-water mark, with a warning.
+
+        :param connection: The destination up-client or peer shard connection.
+        :param data: The encoded UMessage.
+        """
+        if connection.socket not in self.peer_sockets:
+            super()._send_to_up_client(connection, data)
+            return
+        below_high_water_mark: bool = connection.outbound_bytes <= self.high_water_mark
+        connection.queue(data)
+        if len(connection.outbound) == 1 and not self._write_to_up_client(connection):
+            return
+        if below_high_water_mark and connection.outbound_bytes > self.high_water_mark:
+            logger.warning("A peer shard is falling behind, queueing UMessages for it past the high-water mark")
+
+    def _close_connected_socket(self, up_client_socket: socket.socket):
+        """
+        Close a client or peer socket and unregister it from the selector.
+
+        :param up_client_socket: The socket to be closed.
+        """
+        stopping: bool = self.dispatcher_exit or (self.stop is not None and self.stop.is_set())
+        if up_client_socket in self.peer_sockets and not stopping:
+            logger.error("Lost the link to a peer shard, its up-clients no longer exchange UMessages with this shard")
+        self.peer_sockets.discard(up_client_socket)
+        super()._close_connected_socket(up_client_socket)
+
+
+def _run_shard(
+    peer_sockets: List[socket.socket],
+    ready,
+    stop,
+    high_water_mark: int,
+    overflow_policy: str,
+    endpoint: str,
+):
+    """
+    Entry point of a shard worker process: serve up-clients until the stop event is set.
+
+    :param peer_sockets: This shard's ends of the socket pairs connecting it to the other shards.
+    :param ready: Event set once the listening socket is bound.
+    :param stop: Event set by the ShardedDispatcher to stop every shard.
+    :param high_water_mark: Outbound queue high-water mark of each connection.
+    :param overflow_policy: Overflow policy applied to connections falling behind.
+    :param endpoint: The TCP endpoint shared by every shard.
+    """
+    dispatcher = ShardDispatcher(
+        peer_sockets, stop, high_water_mark=high_water_mark, overflow_policy=overflow_policy, endpoint=endpoint
+    )
+    thread = Thread(target=dispatcher.listen_for_client_connections, daemon=True)
+    thread.start()
+    ready.set()
+    stop.wait()
+    dispatcher.close()
+
+
+class ShardedDispatcher:
+    """
+    Dispatcher spreading up-client connections over several worker processes, so that message throughput
+    is not bound to a single core. Every worker runs a ShardDispatcher listening on the same TCP endpoint
+    with SO_REUSEPORT, and the kernel balances incoming connections between them.
+
+    The shards are fully meshed with Unix socket pairs, so a UMessage sent to one shard still reaches
+    the interested up-clients connected to the others. It offers the same listen_for_client_connections() /
+    close() contract as the Dispatcher. SO_REUSEPORT load balancing is only available on Linux.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        high_water_mark: int = OUTBOUND_HIGH_WATER_MARK,
+        overflow_policy: str = OVERFLOW_DROP_OLDEST,
+        endpoint: Optional[str] = None,
+    ):
+        if not sys.platform.startswith("linux"):
+            raise OSError("The sharded dispatcher requires SO_REUSEPORT load balancing, only available on Linux")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}")
+        self.endpoint: str = dispatcher_endpoint(endpoint)
+        if parse_endpoint(self.endpoint)[0] != socket.AF_INET:
+            raise ValueError("The sharded dispatcher requires a tcp:// endpoint")
+        self.workers: int = workers or os.cpu_count() or 1
+        if self.workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        context = multiprocessing.get_context("spawn")
+        self.stop = context.Event()
+        self.closed = Event()
+        self.event_loop_stopped = Event()
+        self.event_loop_stopped.set()
+
+        # Full mesh of socket pairs between the shards
+        mesh: List[List[socket.socket]] = [[] for _ in range(self.workers)]
+        for i in range(self.workers):
+            for j in range(i + 1, self.workers):
+                shard_i_end, shard_j_end = socket.socketpair()
+                mesh[i].append(shard_i_end)
+                mesh[j].append(shard_j_end)
+
+        self.processes: List[multiprocessing.Process] = []
+        ready_events = []
+        try:
+            for index, peer_sockets in enumerate(mesh):
+                ready = context.Event()
+                process = context.Process(
+                    target=_run_shard,
+                    args=(peer_sockets, ready, self.stop, high_water_mark, overflow_policy, self.endpoint),
+                    name=f"dispatcher-shard-{index}",
+                    daemon=True,
+                )
+                process.start()
+                self.processes.append(process)
+                ready_events.append(ready)
+        finally:
+            # The workers hold their own duplicates of the socket pairs
+            for peer_sockets in mesh:
+                for peer_socket in peer_sockets:
+                    peer_socket.close()
+
+        deadline: float = time.monotonic() + SHARD_STARTUP_TIMEOUT
+        for process, ready in zip(self.processes, ready_events):
+            while not ready.wait(timeout=0.1):
+                if not process.is_alive() or time.monotonic() > deadline:
+                    self._stop_workers()
+                    raise RuntimeError(f"Dispatcher shard {process.name} failed to start")
+
+        logger.info(f"Sharded dispatcher is running/listening with {self.workers} workers")
+
+    def listen_for_client_connections(self):
+        """
+        Block until close() is called, while the worker processes serve the up-clients.
+        """
+        self.event_loop_stopped.clear()
+        try:
+            self.closed.wait()
+        finally:
+            self.event_loop_stopped.set()
+
+    def _stop_workers(self):
+        """
+        Ask every worker to close its dispatcher, terminating the ones that do not exit in time.
+        """
+        self.stop.set()
+        for process in self.processes:
+            process.join(timeout=DISPATCHER_CLOSE_TIMEOUT)
+            if process.is_alive():
+                logger.error(f"Dispatcher shard {process.name} did not stop in time, terminating it")
+                process.terminate()
+                process.join()
+
+    def close(self):
+        self._stop_workers()
+        self.closed.set()
+        if not self.event_loop_stopped.wait(timeout=DISPATCHER_CLOSE_TIMEOUT):
+            logger.error("Dispatcher event loop did not stop in time")
+        logger.info("Dispatcher closed!")
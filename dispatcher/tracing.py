@@ -0,0 +1,130 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import logging
+import os
+from typing import Dict, List
+
+# Per-component verbosity of the per-message traces, e.g. UP_TRACE="dispatcher=debug,transport=info".
+# A bare level ("debug") applies to every component. Traces are off (INFO) unless asked for.
+TRACE_ENV = "UP_TRACE"
+# Only every Nth payload is dumped, even when debug traces are enabled
+TRACE_SAMPLE_ENV = "UP_TRACE_SAMPLE"
+# Payload dumps are cut after this many bytes
+TRACE_DUMP_LIMIT_ENV = "UP_TRACE_DUMP_LIMIT"
+
+TRACE_LOGGER_PREFIX = "uprotocol.tck"
+DEFAULT_TRACE_LEVEL = logging.INFO
+DEFAULT_TRACE_SAMPLE: int = 1
+DEFAULT_TRACE_DUMP_LIMIT: int = 256
+
+tracers: List["Tracer"] = []
+
+
+def parse_trace_levels(spec: str) -> Dict[str, int]:
+    """
+    Parses a UP_TRACE specification into logging levels per component, "*" holding the default.
+
+    :param spec: Comma separated "component=level" items or a bare level.
+    :return: A dictionary of component names to logging levels.
+    """
+    levels: Dict[str, int] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        component, _, level_name = item.rpartition("=")
+        level = logging.getLevelName(level_name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown trace level {level_name} in {TRACE_ENV}")
+        levels[component.strip() or "*"] = level
+    return levels
+
+
+def configure_tracing(spec: str):
+    """
+    Applies a UP_TRACE specification to the tracers of this process, and to the processes it starts afterwards.
+
+    :param spec: Comma separated "component=level" items or a bare level.
+    """
+    levels: Dict[str, int] = parse_trace_levels(spec)
+    os.environ[TRACE_ENV] = spec
+    for tracer in tracers:
+        tracer.set_level(levels.get(tracer.component, levels.get("*", DEFAULT_TRACE_LEVEL)))
+
+
+class PayloadDump:
+    """
+    Lazily formatted, truncated representation of a payload, only rendered if a trace record is emitted.
+    """
+
+    __slots__ = ("payload", "limit")
+
+    def __init__(self, payload: bytes, limit: int):
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self) -> str:
+        if len(self.payload) <= self.limit:
+            return repr(bytes(self.payload))
+        return f"{bytes(self.payload[: self.limit])!r}... ({len(self.payload)} bytes)"
+
+
+class Tracer:
+    """
+    Level-gated tracing of a component's hot path.
+    Messages use lazy %-formatting, so nothing is formatted unless the component's level lets the record through,
+    and payload dumps are additionally sampled.
+    """
+
+    def __init__(self, component: str):
+        self.component = component
+        self.logger = logging.getLogger(f"{TRACE_LOGGER_PREFIX}.{component}")
+        levels: Dict[str, int] = parse_trace_levels(os.environ.get(TRACE_ENV, ""))
+        self.logger.setLevel(levels.get(component, levels.get("*", DEFAULT_TRACE_LEVEL)))
+        self.sample_every: int = max(1, int(os.environ.get(TRACE_SAMPLE_ENV, DEFAULT_TRACE_SAMPLE)))
+        self.dump_limit: int = int(os.environ.get(TRACE_DUMP_LIMIT_ENV, DEFAULT_TRACE_DUMP_LIMIT))
+        self.dump_count = 0
+        tracers.append(self)
+
+    def set_level(self, level: int):
+        """
+        Changes the component's verbosity at runtime.
+        """
+        self.logger.setLevel(level)
+
+    def debug(self, msg: str, *args):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(msg, *args, stacklevel=2)
+
+    def info(self, msg: str, *args):
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(msg, *args, stacklevel=2)
+
+    def dump(self, msg: str, payload: bytes, *args):
+        """
+        Traces a payload at debug level, for one in every UP_TRACE_SAMPLE calls.
+
+        :param msg: The message, with a %s placeholder for the payload as first argument.
+        :param payload: The payload to dump, truncated to UP_TRACE_DUMP_LIMIT bytes.
+        """
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        self.dump_count += 1
+        if self.dump_count % self.sample_every:
+            return
+        self.logger.debug(msg, PayloadDump(payload, self.dump_limit), *args, stacklevel=2)
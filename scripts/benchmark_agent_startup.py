@@ -0,0 +1,103 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Measures how long a Python Test Agent takes to start, using the interpreter's -X importtime report.
+# The agent module is imported in a fresh interpreter, as when a feature launches a Test Agent,
+# without connecting to the Test Manager.
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "test_agent", "python")
+AGENT_MODULE = "testagent"
+
+
+def import_agent():
+    """Import the agent in a fresh interpreter, returning its wall time in ms and the -X importtime lines."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {AGENT_MODULE}"],
+        cwd=AGENT_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(1)
+    return wall_ms, [line for line in result.stderr.splitlines() if line.startswith("import time:")]
+
+
+def parse_import_times(lines):
+    """Return the cumulative import time in ms of the agent module and of each module it imports directly."""
+    agent_ms = 0.0
+    direct_imports = {}
+    for line in lines:
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == AGENT_MODULE:
+            agent_ms = int(cumulative) / 1000
+        elif depth == 1:
+            direct_imports[name.strip()] = int(cumulative) / 1000
+    return agent_ms, direct_imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the startup of the Python Test Agent')
+    parser.add_argument('--runs', type=int, default=10, help='Number of interpreters to start')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest direct imports to list')
+    parser.add_argument(
+        '--max-ms', type=float, help='Fail if the median import time of the agent exceeds this many ms', required=False
+    )
+    args = parser.parse_args()
+
+    # The first run compiles the byte code and warms the file system caches, like an installed agent
+    import_agent()
+    wall_times = []
+    agent_times = []
+    direct_import_times = defaultdict(list)
+    for _ in range(args.runs):
+        wall_ms, lines = import_agent()
+        agent_ms, direct_imports = parse_import_times(lines)
+        wall_times.append(wall_ms)
+        agent_times.append(agent_ms)
+        for name, cumulative_ms in direct_imports.items():
+            direct_import_times[name].append(cumulative_ms)
+
+    agent_median = statistics.median(agent_times)
+    print(f"{AGENT_MODULE} import: median {agent_median:.1f} ms, min {min(agent_times):.1f} ms over {args.runs} runs")
+    print(f"interpreter start and import: median {statistics.median(wall_times):.1f} ms")
+    print(f"slowest direct imports of {AGENT_MODULE} (median cumulative ms):")
+    medians = sorted(((statistics.median(times), name) for name, times in direct_import_times.items()), reverse=True)
+    for cumulative_ms, name in medians[: args.top]:
+        print(f"  {cumulative_ms:8.1f}  {name}")
+
+    if args.max_ms is not None and agent_median > args.max_ms:
+        print(f"{AGENT_MODULE} import takes {agent_median:.1f} ms, more than the {args.max_ms:.1f} ms allowed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
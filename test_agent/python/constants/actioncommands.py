@@ -31,3 +31,5 @@ VALIDATE_UATTRIBUTES = "uattributes_validate"
 MICRO_SERIALIZE_URI = "micro_serialize_uri"
 MICRO_DESERIALIZE_URI = "micro_deserialize_uri"
 INITIALIZE_TRANSPORT = "initialize_transport"
+BATCH = "batch"
+RELEASE = "release"
@@ -26,3 +26,5 @@
 
 TEST_MANAGER_ADDR = ("127.0.0.5", 33333)
 BYTES_MSG_LENGTH: int = 32767
+# Threads running the validators, so that validating does not hold up the other commands
+VALIDATOR_WORKERS: int = 4
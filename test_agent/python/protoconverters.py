@@ -0,0 +1,204 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import keyword
+from typing import Any, Callable, Dict, List
+
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+from google.protobuf.message import Message
+
+# Conversions between protobuf messages and the dicts exchanged with the Test Manager.
+# The converters of a message type are generated from its descriptor the first time the type is converted,
+# as straight-line functions reading or writing each of its fields, and cached by full type name.
+
+# Prefix of the strings the Test Manager sends for bytes fields
+BYTES_PREFIX = "BYTES:"
+
+INT_FIELD_TYPES = frozenset(
+    {
+        FieldDescriptor.TYPE_INT32,
+        FieldDescriptor.TYPE_INT64,
+        FieldDescriptor.TYPE_UINT32,
+        FieldDescriptor.TYPE_UINT64,
+        FieldDescriptor.TYPE_SINT32,
+        FieldDescriptor.TYPE_SINT64,
+        FieldDescriptor.TYPE_FIXED32,
+        FieldDescriptor.TYPE_FIXED64,
+        FieldDescriptor.TYPE_SFIXED32,
+        FieldDescriptor.TYPE_SFIXED64,
+        FieldDescriptor.TYPE_ENUM,
+    }
+)
+FLOAT_FIELD_TYPES = frozenset({FieldDescriptor.TYPE_FLOAT, FieldDescriptor.TYPE_DOUBLE})
+
+to_dict_converters: Dict[str, Callable[[Message], Dict[str, Any]]] = {}
+from_dict_converters: Dict[str, Callable[[Dict[str, Any], Message], None]] = {}
+
+
+def _attribute(variable: str, field: FieldDescriptor) -> str:
+    """
+    Returns the expression reading a field, which is not an attribute access for field names that are keywords.
+    """
+    if keyword.iskeyword(field.name):
+        return f"getattr({variable}, {field.name!r})"
+    return f"{variable}.{field.name}"
+
+
+def _is_map(field: FieldDescriptor) -> bool:
+    return field.message_type is not None and field.message_type.GetOptions().map_entry
+
+
+def _compile(source: str, function_name: str, namespace: Dict[str, Any], full_name: str) -> Callable:
+    exec(compile(source, f"<{function_name} {full_name}>", "exec"), namespace)
+    return namespace[function_name]
+
+
+def _to_dict_converter(descriptor: Descriptor) -> Callable[[Message], Dict[str, Any]]:
+    """
+    Returns the cached converter of a message type to a dict, generating it on first use.
+
+    :param descriptor: The descriptor of the message type.
+    """
+    converter = to_dict_converters.get(descriptor.full_name)
+    if converter is not None:
+        return converter
+
+    full_name: str = descriptor.full_name
+    # Recursive message types convert their nested messages through the cache until their converter is generated
+    to_dict_converters[full_name] = lambda message: to_dict_converters[full_name](message)
+    namespace: Dict[str, Any] = {}
+    items: List[str] = []
+    for index, field in enumerate(descriptor.fields):
+        read: str = _attribute("message", field)
+        if _is_map(field):
+            value_field: FieldDescriptor = field.message_type.fields_by_name["value"]
+            if value_field.message_type is not None:
+                namespace[f"convert_{index}"] = _to_dict_converter(value_field.message_type)
+                expression = f"{{key: convert_{index}(item) for key, item in {read}.items()}}"
+            else:
+                expression = f"dict({read})"
+        elif field.message_type is not None:
+            namespace[f"convert_{index}"] = _to_dict_converter(field.message_type)
+            if field.label == FieldDescriptor.LABEL_REPEATED:
+                expression = f"[convert_{index}(item) for item in {read}]"
+            else:
+                expression = f"convert_{index}({read})"
+        elif field.type == FieldDescriptor.TYPE_BYTES:
+            if field.label == FieldDescriptor.LABEL_REPEATED:
+                expression = f"[item.decode() for item in {read}]"
+            else:
+                expression = f"{read}.decode()"
+        elif field.label == FieldDescriptor.LABEL_REPEATED:
+            expression = f"list({read})"
+        else:
+            expression = read
+        items.append(f"        {field.name!r}: {expression},\n")
+
+    source = "def to_dict(message):\n    return {\n" + "".join(items) + "    }\n"
+    converter = _compile(source, "to_dict", namespace, full_name)
+    to_dict_converters[full_name] = converter
+    return converter
+
+
+def _from_dict_converter(descriptor: Descriptor) -> Callable[[Dict[str, Any], Message], None]:
+    """
+    Returns the cached converter of a dict to a message type, generating it on first use.
+
+    :param descriptor: The descriptor of the message type.
+    """
+    converter = from_dict_converters.get(descriptor.full_name)
+    if converter is not None:
+        return converter
+
+    full_name: str = descriptor.full_name
+    from_dict_converters[full_name] = lambda json_obj, proto_obj: from_dict_converters[full_name](json_obj, proto_obj)
+    namespace: Dict[str, Any] = {"MISSING": object(), "BYTES_PREFIX": BYTES_PREFIX}
+    lines: List[str] = ["def from_dict(json_obj, proto_obj):\n", "    get = json_obj.get\n"]
+    for index, field in enumerate(descriptor.fields):
+        read: str = _attribute("proto_obj", field)
+        if keyword.iskeyword(field.name):
+            write = f"setattr(proto_obj, {field.name!r}, value)"
+        else:
+            write = f"proto_obj.{field.name} = value"
+        lines.append(f"    value = get({field.name!r}, MISSING)\n")
+        lines.append("    if value is not MISSING:\n")
+        if field.label == FieldDescriptor.LABEL_REPEATED:
+            # Repeated fields cannot be assigned: the error is raised like for any invalid value
+            lines.append(f"        {write}\n")
+        elif field.message_type is not None:
+            namespace[f"convert_{index}"] = _from_dict_converter(field.message_type)
+            lines.append("        if isinstance(value, dict):\n")
+            lines.append(f"            convert_{index}(value, {read})\n")
+            lines.append("        else:\n")
+            lines.append(f"            {write}\n")
+        elif field.type in INT_FIELD_TYPES or field.type in FLOAT_FIELD_TYPES:
+            # Values that cannot be cast, such as enum names, are set as they are
+            cast = "int" if field.type in INT_FIELD_TYPES else "float"
+            lines.append("        try:\n")
+            lines.append(f"            value = {cast}(value)\n")
+            lines.append("        except Exception:\n")
+            lines.append("            pass\n")
+            lines.append(f"        {write}\n")
+        elif field.type == FieldDescriptor.TYPE_BYTES:
+            lines.append("        if isinstance(value, str):\n")
+            lines.append('            value = value.replace(BYTES_PREFIX, "").encode("utf-8")\n')
+            lines.append(f"        {write}\n")
+        elif field.type == FieldDescriptor.TYPE_STRING:
+            # Prefixed strings are set as bytes, which protobuf decodes
+            lines.append("        if isinstance(value, str) and BYTES_PREFIX in value:\n")
+            lines.append('            value = value.replace(BYTES_PREFIX, "").encode("utf-8")\n')
+            lines.append(f"        {write}\n")
+        else:
+            lines.append(f"        {write}\n")
+
+    converter = _compile("".join(lines), "from_dict", namespace, full_name)
+    from_dict_converters[full_name] = converter
+    return converter
+
+
+def message_to_dict(message: Message) -> Dict[str, Any]:
+    """Converts protobuf Message to Dict and keeping respective data types
+
+    Args:
+        message (Message): protobuf Message
+
+    Returns:
+        Dict[str, Any]: Dict/JSON version of the Message, with every field and bytes decoded to str
+    """
+    converter = to_dict_converters.get(message.DESCRIPTOR.full_name)
+    if converter is None:
+        converter = _to_dict_converter(message.DESCRIPTOR)
+    return converter(message)
+
+
+def dict_to_proto(parent_json_obj: Dict[str, Any], parent_proto_obj: Message) -> Message:
+    """Populates a protobuf Message from a Dict received from the Test Manager
+
+    Args:
+        parent_json_obj (Dict[str, Any]): Dict/JSON version of the Message, keys not naming a field are ignored
+        parent_proto_obj (Message): protobuf Message to be populated
+
+    Returns:
+        Message: the populated protobuf Message
+    """
+    if not isinstance(parent_json_obj, dict):
+        raise TypeError("variable parent_json_obj is not a Dict type")
+    converter = from_dict_converters.get(parent_proto_obj.DESCRIPTOR.full_name)
+    if converter is None:
+        converter = _from_dict_converter(parent_proto_obj.DESCRIPTOR)
+    converter(parent_json_obj, parent_proto_obj)
+    return parent_proto_obj
@@ -16,36 +16,24 @@ SPDX-License-Identifier: Apache-2.0
 """
 
 import asyncio
-import json
 import logging
-import random
+import os
 import socket
 import sys
 import time
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 from datetime import datetime, timezone
-from threading import Thread
-from typing import Any, Dict, List, Union
+from functools import lru_cache
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
-import git
 from constants import actioncommands, constants
-from google.protobuf import any_pb2
-from google.protobuf.descriptor import FieldDescriptor
 from google.protobuf.message import Message
-from google.protobuf.wrappers_pb2 import StringValue
-from uprotocol.communication.upayload import UPayload
-from uprotocol.transport.builder.umessagebuilder import UMessageBuilder
+from protoconverters import dict_to_proto, message_to_dict
 from uprotocol.transport.ulistener import UListener
-from uprotocol.transport.validator import uattributesvalidator
-from uprotocol.transport.validator.uattributesvalidator import (
-    UAttributesValidator,
-)
 from uprotocol.uri.serializer.uriserializer import UriSerializer
-from uprotocol.uri.validator.urivalidator import UriValidator
-from uprotocol.uuid.factory.uuidfactory import Factories
-from uprotocol.uuid.factory.uuidutils import UUIDUtils
-from uprotocol.uuid.serializer.uuidserializer import UuidSerializer
-from uprotocol.uuid.validator.uuidvalidator import UuidValidator, Validators
 from uprotocol.v1.uattributes_pb2 import UAttributes, UMessageType, UPayloadFormat
 from uprotocol.v1.ucode_pb2 import UCode
 from uprotocol.v1.umessage_pb2 import UMessage
@@ -54,22 +42,42 @@ from uprotocol.v1.ustatus_pb2 import UStatus
 from uprotocol.v1.uuid_pb2 import UUID
 from uprotocol.validation.validationresult import ValidationResult
 
-repo = git.Repo(".", search_parent_directories=True)
-sys.path.insert(0, repo.working_tree_dir)
-from up_client_socket.python.socket_transport import SocketUTransport
+# The repository root, holding the control channel and the socket transport shared with the Test Manager
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+from test_manager.control_channel import MessageStreamDecoder, encode_message, supported_encodings
+
+# What only some commands use is imported on first use, keeping the agent startup short
+if TYPE_CHECKING:
+    from uprotocol.transport.validator.uattributesvalidator import UAttributesValidator
+
+    from up_client_socket.python.socket_transport import SocketUTransport
 
 logging.basicConfig(format="%(levelname)s| %(filename)s:%(lineno)s %(message)s")
 logger = logging.getLogger("File:Line# Debugger")
 logger.setLevel(logging.DEBUG)
 
-RESPONSE_URI = UUri(ue_id=random.randrange(0, 0x7FFF), ue_version_major=1, resource_id=0)
-
 sdkname = "python"
 transport_name = "socket"  # Not used right now, will be when more transports are added to python
 
+# Optional features announced to the Test Manager in the initialize message
+capabilities = [actioncommands.BATCH, actioncommands.RELEASE]
+# Requests from the Test Manager, answered in the encoding it uses
+tm_message_decoder = MessageStreamDecoder()
+# Responses are sent from the receiving thread and from listener callbacks, one whole message at a time
+send_lock = Lock()
+# When the request being handled was received, in nanoseconds of the monotonic clock
+request_received_ns: ContextVar[Optional[int]] = ContextVar("request_received_ns", default=None)
+# Responses of the batch being run, gathered to be sent back to the Test Manager in a single message
+batch_responses: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("batch_responses", default=None)
+# Commands run concurrently, each in its own task, referenced until it is done
+running_commands: Set[asyncio.Task] = set()
+# test_id of the commands in progress that have sent their response
+answered_test_ids: Set[str] = set()
+validator_pool = ThreadPoolExecutor(max_workers=constants.VALIDATOR_WORKERS, thread_name_prefix="validator")
+
 
 class SocketUListener(UListener):
-    def on_receive(self, umsg: UMessage) -> None:
+    async def on_receive(self, umsg: UMessage) -> None:
         logger.info("Listener received")
         if umsg is None:
             raise ValueError("UMessage is None")
@@ -78,6 +86,11 @@ class SocketUListener(UListener):
         elif umsg.attributes is None:
             raise ValueError("UMessage attributes is None")
         if umsg.attributes.type == UMessageType.UMESSAGE_TYPE_REQUEST:
+            from google.protobuf import any_pb2
+            from google.protobuf.wrappers_pb2 import StringValue
+            from uprotocol.communication.upayload import UPayload
+            from uprotocol.transport.builder.umessagebuilder import UMessageBuilder
+
             any_obj = any_pb2.Any()
             any_obj.Pack(StringValue(value="SuccessRPCResponse"))
             payload = UPayload(
@@ -89,59 +102,22 @@ class SocketUListener(UListener):
                 umsg.attributes.source,
                 umsg.attributes.id,
             ).build_from_upayload(payload)
-            transport.send(res_msg)
+            await get_transport().send(res_msg)
         else:
             send_to_test_manager(umsg, actioncommands.RESPONSE_ON_RECEIVE)
 
 
-transport = SocketUTransport(RESPONSE_URI)
+# Created by the initialize_transport command, with the source it gives
+transport: Optional["SocketUTransport"] = None
 listener = SocketUListener()
 
 
-def message_to_dict(message: Message) -> Dict[str, Any]:
-    """Converts protobuf Message to Dict and keeping respective data types
-
-    Args:
-        message (Message): protobuf Message
-
-    Returns:
-        Dict[str, Any]: Dict/JSON version of the Message
-    """
-    result: Dict[str, Any] = {}
-
-    all_fields: List[FieldDescriptor] = message.DESCRIPTOR.fields
-    for field in all_fields:
-        value = getattr(message, field.name, field.default_value)
-        if isinstance(value, bytes):
-            value: str = value.decode()
-
-        # If a protobuf Message object
-        if hasattr(value, "DESCRIPTOR"):
-            result[field.name] = message_to_dict(value)
-        elif field.label == FieldDescriptor.LABEL_REPEATED:
-            repeated = []
-            for sub_msg in value:
-                if hasattr(sub_msg, "DESCRIPTOR"):
-                    # Add Message type protobuf
-                    repeated.append(message_to_dict(sub_msg))
-                else:
-                    # Add primitive type (str, bool, bytes, int)
-                    repeated.append(value)
-            result[field.name] = repeated
-
-        # If the field is not a protobuf object (e.g. primitive type)
-        elif field.label == FieldDescriptor.LABEL_REQUIRED or field.label == FieldDescriptor.LABEL_OPTIONAL:
-            result[field.name] = value
-
-    return result
-
-
 def send_to_test_manager(
-    response: Union[Message, str, dict],
+    response: Union[Message, str, dict, list],
     action: str,
     received_test_id: str = "",
 ):
-    if not isinstance(response, (dict, str)):
+    if not isinstance(response, (dict, str, list)):
         # Converts protobuf to dict
         response = message_to_dict(response)
 
@@ -152,64 +128,143 @@ def send_to_test_manager(
         "ue": sdkname,
         "test_id": received_test_id,
     }
-    response_dict = json.dumps(response_dict).encode("utf-8")
-    ta_socket.sendall(response_dict)
+    if received_test_id:
+        answered_test_ids.add(received_test_id)
+    received_ns: Optional[int] = request_received_ns.get()
+    if received_test_id and received_ns is not None:
+        # Lets the Test Manager tell the time spent handling the request from the time spent on the channel
+        response_dict["timestamps"] = {"received": received_ns, "handled": time.monotonic_ns()}
+    responses: Optional[List[Dict[str, Any]]] = batch_responses.get()
+    if responses is not None and action != actioncommands.RESPONSE_ON_RECEIVE:
+        responses.append(response_dict)
+        return
+    response_dict = encode_message(response_dict, tm_message_decoder.encoding)
+    with send_lock:
+        ta_socket.sendall(response_dict)
     logger.info(f"Sent to TM {response_dict}")
 
 
-def dict_to_proto(parent_json_obj: Dict[str, Any], parent_proto_obj: Message):
-    def populate_fields(json_obj: Dict[str, Any], proto_obj):
-        for field_name, value in json_obj.items():
-            # check if incoming json request is a "bytes" type with prepended prefix
-            if isinstance(value, str) and "BYTES:" in value:
-                value = value.replace("BYTES:", "")
-                value = value.encode("utf-8")
-
-            if hasattr(proto_obj, field_name):
-                if isinstance(value, dict):
-                    # Recursively update the nested message object
-                    populate_fields(value, getattr(proto_obj, field_name))
-                else:
-                    field_type = type(getattr(proto_obj, field_name))
-                    try:
-                        if field_type is int:
-                            value = int(value)
-                        elif field_type is float:
-                            value = float(value)
-                        elif field_type is bytes:
-                            if isinstance(value, str):
-                                value = value.encode("utf-8")
-
-                    except Exception:
-                        pass
-
-                    logger.info(f"setting {field_name} to {value}")
-                    setattr(proto_obj, field_name, value)
-        return proto_obj
-
-    if isinstance(parent_json_obj, dict):
-        populate_fields(parent_json_obj, parent_proto_obj)
-    else:
-        raise TypeError("variable parent_json_obj is not a Dict type")
+async def run_validator(validator: Callable, *args):
+    """
+    Runs a validator on the validator pool, letting the other commands run meanwhile.
+    """
+    return await asyncio.get_running_loop().run_in_executor(validator_pool, validator, *args)
+
+
+@lru_cache(maxsize=None)
+def uri_validators() -> Dict[str, Callable]:
+    from uprotocol.uri.validator.urivalidator import UriValidator
+
+    return {
+        "is_empty": UriValidator.is_empty,
+        "is_rpc_method": UriValidator.is_rpc_method,
+        "is_rpc_response": UriValidator.is_rpc_response,
+        "is_default_resource_id": UriValidator.is_default_resource_id,
+        "is_topic": UriValidator.is_topic,
+        "matches": UriValidator.matches,
+    }
+
+
+@lru_cache(maxsize=None)
+def uuid_candidates() -> Dict[str, Callable[[], UUID]]:
+    """
+    UUIDs to validate, created on demand as only one is validated per command.
+    """
+    from uprotocol.uuid.factory.uuidfactory import Factories
+    from uprotocol.uuid.serializer.uuidserializer import UuidSerializer
+
+    return {
+        "uprotocol": Factories.UPROTOCOL.create,
+        "invalid": lambda: UUID(msb=0, lsb=0),
+        "uprotocol_time": lambda: Factories.UPROTOCOL.create(datetime.fromtimestamp(0, timezone.utc)),
+        "uuidv6": Factories.UUIDV6.create,
+        "uuidv4": lambda: UuidSerializer.deserialize("195f9bd1-526d-4c28-91b1-ff34c8e3632d"),
+    }
+
+
+@lru_cache(maxsize=None)
+def uuid_validators() -> Dict[str, Callable[[UUID], Union[bool, UStatus]]]:
+    from uprotocol.uuid.factory.uuidutils import UUIDUtils
+    from uprotocol.uuid.validator.uuidvalidator import UuidValidator, Validators
+
+    return {
+        "get_validator": lambda uuid: UuidValidator.get_validator(uuid).validate(uuid),
+        "uprotocol": Validators.UPROTOCOL.validator().validate,
+        "uuidv6": Validators.UUIDV6.validator().validate,
+        "get_validator_is_uuidv6": UUIDUtils.is_uuidv6,
+    }
+
+
+# Validation types running a single check of a validator, the others running all of its checks with validate()
+UATTRIBUTES_VALIDATION_TYPES: Dict[str, List[str]] = {
+    "publish_validator": [
+        "is_expired",
+        "validate_ttl",
+        "validate_sink",
+        "validate_req_id",
+        "validate_id",
+        "validate_permission_level",
+    ],
+    "request_validator": ["is_expired", "validate_ttl", "validate_sink", "validate_req_id", "validate_id"],
+    "response_validator": ["is_expired", "validate_ttl", "validate_sink", "validate_req_id", "validate_id"],
+    "notification_validator": [
+        "is_expired",
+        "validate_ttl",
+        "validate_sink",
+        "validate_req_id",
+        "validate_id",
+        "validate_type",
+    ],
+}
+
+
+@lru_cache(maxsize=None)
+def uattributes_validators() -> Dict[str, "UAttributesValidator"]:
+    """
+    The validators are stateless, so one instance of each serves every command.
+    """
+    from uprotocol.transport.validator.uattributesvalidator import Validators
+
+    return {
+        "publish_validator": Validators.PUBLISH.validator(),
+        "request_validator": Validators.REQUEST.validator(),
+        "response_validator": Validators.RESPONSE.validator(),
+        "notification_validator": Validators.NOTIFICATION.validator(),
+    }
+
 
-    return parent_proto_obj
+@lru_cache(maxsize=None)
+def uattributes_validator_methods() -> Dict[Tuple[str, str], Callable[[UAttributes], Any]]:
+    return {
+        (val_method, val_type): getattr(uattributes_validators()[val_method], val_type)
+        for val_method, val_types in UATTRIBUTES_VALIDATION_TYPES.items()
+        for val_type in val_types
+    }
+
+
+def get_transport() -> "SocketUTransport":
+    if transport is None:
+        raise RuntimeError("Transport not initialized, the initialize_transport command has to run first")
+    return transport
 
 
 async def handle_send_command(json_msg):
+    from uprotocol.uuid.factory.uuidfactory import Factories
+
     umsg = dict_to_proto(json_msg["data"], UMessage())
     umsg.attributes.id.CopyFrom(Factories.UPROTOCOL.create())
-    return await transport.send(umsg)
+    return await get_transport().send(umsg)
 
 
 async def handle_register_listener_command(json_msg) -> UStatus:
     uri = dict_to_proto(json_msg["data"], UUri())
-    status: UStatus = await transport.register_listener(uri, listener)
+    status: UStatus = await get_transport().register_listener(uri, listener)
     return status
 
 
 async def handle_unregister_listener_command(json_msg):
     uri = dict_to_proto(json_msg["data"], UUri())
-    return await transport.unregister_listener(uri, listener)
+    return await get_transport().unregister_listener(uri, listener)
 
 
 async def handle_serialize_uuri(json_msg: Dict[str, Any]):
@@ -232,6 +287,8 @@ async def handle_deserialize_uri(json_msg: Dict[str, Any]):
 
 
 async def handle_deserialize_uuid(json_msg: Dict[str, Any]):
+    from uprotocol.uuid.serializer.uuidserializer import UuidSerializer
+
     uuid: UUID = UuidSerializer.deserialize(json_msg["data"])
     send_to_test_manager(
         uuid,
@@ -240,7 +297,9 @@ async def handle_deserialize_uuid(json_msg: Dict[str, Any]):
     )
 
 
-def handle_serialize_uuid(json_msg: Dict[str, Any]):
+async def handle_serialize_uuid(json_msg: Dict[str, Any]):
+    from uprotocol.uuid.serializer.uuidserializer import UuidSerializer
+
     uuid: UUID = dict_to_proto(json_msg["data"], UUID())
     serialized_uuid: str = UuidSerializer.serialize(uuid)
     send_to_test_manager(
@@ -256,21 +315,14 @@ async def handle_uri_validate_command(json_msg: Dict[str, Any]):
 
     uuri: UUri = dict_to_proto(uuri_data, UUri())
 
-    validator_func = {
-        "is_empty": UriValidator.is_empty,
-        "is_rpc_method": UriValidator.is_rpc_method,
-        "is_rpc_response": UriValidator.is_rpc_response,
-        "is_default_resource_id": UriValidator.is_default_resource_id,
-        "is_topic": UriValidator.is_topic,
-        "matches": UriValidator.matches,
-    }.get(val_type)
+    validator_func = uri_validators().get(val_type)
 
     if validator_func:
         if val_type == "matches":
             uri_to_match = UriSerializer.deserialize(json_msg["data"]["uuri_2"])
-            status: Union[bool, ValidationResult] = validator_func(uuri, uri_to_match)
+            status: Union[bool, ValidationResult] = await run_validator(validator_func, uuri, uri_to_match)
         else:
-            status: Union[bool, ValidationResult] = validator_func(uuri)
+            status: Union[bool, ValidationResult] = await run_validator(validator_func, uuri)
         if isinstance(status, bool):
             result = str(status)
             message = ""
@@ -297,20 +349,10 @@ async def handle_uuid_validate_command(json_msg):
     uuid_type = json_msg["data"].get("uuid_type")
     validator_type = json_msg["data"]["validator_type"]
 
-    uuid = {
-        "uprotocol": Factories.UPROTOCOL.create(),
-        "invalid": UUID(msb=0, lsb=0),
-        "uprotocol_time": Factories.UPROTOCOL.create(datetime.utcfromtimestamp(0).replace(tzinfo=timezone.utc)),
-        "uuidv6": Factories.UUIDV6.create(),
-        "uuidv4": UuidSerializer.deserialize("195f9bd1-526d-4c28-91b1-ff34c8e3632d"),
-    }.get(uuid_type)
-
-    status = {
-        "get_validator": UuidValidator.get_validator(uuid).validate(uuid),
-        "uprotocol": Validators.UPROTOCOL.validator().validate(uuid),
-        "uuidv6": Validators.UUIDV6.validator().validate(uuid),
-        "get_validator_is_uuidv6": UUIDUtils.is_uuidv6(uuid),
-    }.get(validator_type)
+    create_uuid: Optional[Callable[[], UUID]] = uuid_candidates().get(uuid_type)
+    uuid: Optional[UUID] = create_uuid() if create_uuid is not None else None
+
+    status = await run_validator(uuid_validators()[validator_type], uuid)
 
     if isinstance(status, bool):
         result = str(status)
@@ -327,6 +369,9 @@ async def handle_uuid_validate_command(json_msg):
 
 
 async def handle_uattributes_validate_command(json_msg: Dict[str, Any]):
+    from uprotocol.transport.validator.uattributesvalidator import UAttributesValidator
+    from uprotocol.uuid.factory.uuidfactory import Factories
+
     data = json_msg["data"]
     val_method = data.get("validation_method")
     val_type = data.get("validation_type")
@@ -347,55 +392,18 @@ async def handle_uattributes_validate_command(json_msg: Dict[str, Any]):
     elif data.get("reqid") == "uuid":
         attributes.reqid.CopyFrom(Factories.UUIDV6.create())
 
-    validator_type = {
-        "get_validator": UAttributesValidator.get_validator,
-    }.get(val_type)
-
-    pub_val = uattributesvalidator.Validators.PUBLISH.validator()
-    req_val = uattributesvalidator.Validators.REQUEST.validator()
-    res_val = uattributesvalidator.Validators.RESPONSE.validator()
-    not_val = uattributesvalidator.Validators.NOTIFICATION.validator()
-
-    validator_method = {
-        "publish_validator": {
-            "is_expired": pub_val.is_expired,
-            "validate_ttl": pub_val.validate_ttl,
-            "validate_sink": pub_val.validate_sink,
-            "validate_req_id": pub_val.validate_req_id,
-            "validate_id": pub_val.validate_id,
-            "validate_permission_level": pub_val.validate_permission_level,
-        }.get(val_type, pub_val.validate),
-        "request_validator": {
-            "is_expired": req_val.is_expired,
-            "validate_ttl": req_val.validate_ttl,
-            "validate_sink": req_val.validate_sink,
-            "validate_req_id": req_val.validate_req_id,
-            "validate_id": req_val.validate_id,
-        }.get(val_type, req_val.validate),
-        "response_validator": {
-            "is_expired": res_val.is_expired,
-            "validate_ttl": res_val.validate_ttl,
-            "validate_sink": res_val.validate_sink,
-            "validate_req_id": res_val.validate_req_id,
-            "validate_id": res_val.validate_id,
-        }.get(val_type, res_val.validate),
-        "notification_validator": {
-            "is_expired": not_val.is_expired,
-            "validate_ttl": not_val.validate_ttl,
-            "validate_sink": not_val.validate_sink,
-            "validate_req_id": not_val.validate_req_id,
-            "validate_id": not_val.validate_id,
-            "validate_type": not_val.validate_type,
-        }.get(val_type, not_val.validate),
-    }.get(val_method)
+    validator: Optional[UAttributesValidator] = uattributes_validators().get(val_method)
+    validator_method: Optional[Callable[[UAttributes], Any]] = uattributes_validator_methods().get(
+        (val_method, val_type), validator.validate if validator is not None else None
+    )
 
     if attributes.ttl == 1:
-        time.sleep(0.8)
+        await asyncio.sleep(0.8)
 
     if val_type == "get_validator":
-        status = validator_type(attributes)
+        status = UAttributesValidator.get_validator(attributes)
     if validator_method is not None:
-        status = validator_method(attributes)
+        status = await run_validator(validator_method, attributes)
 
     if isinstance(status, ValidationResult):
         result = str(status.is_success())
@@ -415,9 +423,15 @@ async def handle_uattributes_validate_command(json_msg: Dict[str, Any]):
 
 
 async def handle_initialize_transport_command(json_msg: Dict[str, Any]):
-    global transport, listener
+    global transport, listener, sdkname
     source = dict_to_proto(json_msg["data"], UUri())
+    # A Test Agent started ahead of time is given its name with its source
+    sdkname = json_msg.get("sdk_name", sdkname)
     if transport_name == "socket":
+        from up_client_socket.python.socket_transport import SocketUTransport
+
+        if transport is not None:
+            transport.close()
         transport = SocketUTransport(source)
         listener = SocketUListener()
     else:
@@ -434,6 +448,38 @@ async def handle_initialize_transport_command(json_msg: Dict[str, Any]):
     )
 
 
+async def handle_release_command(json_msg: Dict[str, Any]):
+    """
+    Goes back to the Test Manager's agent pool: the transport and its listeners are closed, and the Test Agent
+    takes the idle name it is given until it is initialized again.
+    """
+    global transport, sdkname
+    if transport is not None:
+        transport.close()
+        transport = None
+    sdkname = json_msg.get("sdk_name", sdkname)
+    send_to_test_manager(
+        UStatus(code=UCode.OK, message=""),
+        actioncommands.RELEASE,
+        received_test_id=json_msg["test_id"],
+    )
+
+
+async def handle_batch_command(json_msg: Dict[str, Any]):
+    responses: List[Dict[str, Any]] = []
+    received_ns: Optional[int] = request_received_ns.get()
+    token = batch_responses.set(responses)
+    try:
+        # Batched commands run one after the other, in order
+        for command in json_msg["data"]:
+            request_received_ns.set(time.monotonic_ns())
+            await run_command(command)
+    finally:
+        batch_responses.reset(token)
+        request_received_ns.set(received_ns)
+    send_to_test_manager(responses, actioncommands.BATCH, received_test_id=json_msg["test_id"])
+
+
 action_handlers = {
     actioncommands.SEND_COMMAND: handle_send_command,
     actioncommands.REGISTER_LISTENER_COMMAND: handle_register_listener_command,
@@ -446,6 +492,8 @@ action_handlers = {
     actioncommands.VALIDATE_UATTRIBUTES: handle_uattributes_validate_command,
     actioncommands.VALIDATE_UUID: handle_uuid_validate_command,
     actioncommands.INITIALIZE_TRANSPORT: handle_initialize_transport_command,
+    actioncommands.BATCH: handle_batch_command,
+    actioncommands.RELEASE: handle_release_command,
 }
 
 
@@ -460,15 +508,37 @@ async def process_message(json_data):
         send_to_test_manager(status, action, received_test_id=json_data["test_id"])
 
 
+async def run_command(json_data: Dict[str, Any]):
+    test_id: str = json_data["test_id"]
+    try:
+        await process_message(json_data)
+    except Exception as e:
+        logger.error(f"Error running {json_data['action']} command: {e}")
+        # The Test Manager gets a response instead of waiting for one until it times out, unless it already has one
+        if test_id not in answered_test_ids:
+            send_to_test_manager(
+                UStatus(code=UCode.INTERNAL, message=str(e)), json_data["action"], received_test_id=test_id
+            )
+    finally:
+        answered_test_ids.discard(test_id)
+
+
 async def receive_from_tm():
+    loop = asyncio.get_running_loop()
     while True:
-        recv_data = ta_socket.recv(constants.BYTES_MSG_LENGTH)
+        # Reading on another thread leaves the event loop running the commands in progress
+        recv_data = await loop.run_in_executor(None, ta_socket.recv, constants.BYTES_MSG_LENGTH)
         if not recv_data or recv_data == b"":
             return
-        # Deserialize the JSON data
-        json_data = json.loads(recv_data.decode("utf-8"))
-        logger.info("Received data from test manager: %s", json_data)
-        await process_message(json_data)
+        # Deserialize the JSON data, a recv may hold part of a request or several of them
+        received_ns: int = time.monotonic_ns()
+        for json_data in tm_message_decoder.feed(recv_data):
+            request_received_ns.set(received_ns)
+            logger.info("Received data from test manager: %s", json_data)
+            # Responses are matched to their requests by test_id, so commands complete in any order
+            task: asyncio.Task = asyncio.create_task(run_command(json_data))
+            running_commands.add(task)
+            task.add_done_callback(running_commands.discard)
 
 
 if __name__ == "__main__":
@@ -488,6 +558,8 @@ if __name__ == "__main__":
 
     ta_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     ta_socket.connect(constants.TEST_MANAGER_ADDR)
-    thread = Thread(target=asyncio.run, args=(receive_from_tm(),))
-    thread.start()
-    send_to_test_manager({"SDK_name": sdkname}, "initialize")
+    send_to_test_manager(
+        {"SDK_name": sdkname, "capabilities": capabilities, "encodings": supported_encodings()}, "initialize"
+    )
+    # The commands run on the main thread's event loop, as executors are unusable once the main thread is done
+    asyncio.run(receive_from_tm())
@@ -0,0 +1,237 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import json
+import logging
+import re
+import struct
+from typing import Any, Dict, List, Sequence
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger("File:Line# Debugger")
+
+# Encodings of the messages between the Test Manager and the Test Agents.
+# JSON messages are JSON documents, each followed by a newline. json.dumps escapes newlines inside strings,
+# so a newline only ever ends a message.
+# msgpack messages are binary: a NUL marker, which never starts a JSON document, and the big-endian length
+# of the msgpack encoded message. A Test Agent lists the encodings it can decode in its initialize message,
+# and is only sent msgpack messages if it listed it. It answers in the encoding of the requests it receives.
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+MESSAGE_DELIMITER = b"\n"
+BINARY_MESSAGE_MARKER: int = 0x00
+BINARY_MESSAGE_HEADER = struct.Struct("!BI")
+# A partial message growing past this many bytes is discarded, as its peer is not sending valid messages
+MAX_PENDING_MESSAGE_SIZE: int = 64 * 1024 * 1024
+
+WHITESPACE = b" \t\r\n"
+# Bytes the end of a JSON message without newline is found from
+JSON_STRUCTURE_PATTERN = re.compile(rb'[{}\[\]"\\]')
+JSON_OPENING_BYTES = b"{["
+JSON_CLOSING_BYTES = b"}]"
+QUOTE: int = ord('"')
+BACKSLASH: int = ord("\\")
+
+
+def supported_encodings() -> List[str]:
+    """
+    Lists the encodings this process can decode, by order of preference.
+    """
+    return [ENCODING_MSGPACK, ENCODING_JSON] if msgpack is not None else [ENCODING_JSON]
+
+
+def negotiate_encoding(peer_encodings: Sequence[str]) -> str:
+    """
+    Selects the preferred encoding supported by both ends of a connection.
+
+    :param peer_encodings: The encodings the peer announced, JSON being assumed if it announced none.
+    :return: The encoding to send messages to the peer with.
+    """
+    for encoding in supported_encodings():
+        if encoding in peer_encodings:
+            return encoding
+    return ENCODING_JSON
+
+
+def encode_message(message: Dict[str, Any], encoding: str = ENCODING_JSON) -> bytes:
+    """
+    Serializes a message for the control channel between the Test Manager and the Test Agents.
+
+    :param message: The message.
+    :param encoding: ENCODING_JSON, or ENCODING_MSGPACK if the peer supports it.
+    :return: The encoded message, delimited for the stream.
+    """
+    if encoding == ENCODING_MSGPACK:
+        body: bytes = msgpack.packb(message)
+        return BINARY_MESSAGE_HEADER.pack(BINARY_MESSAGE_MARKER, len(body)) + body
+    return json.dumps(message).encode("utf-8") + MESSAGE_DELIMITER
+
+
+class MessageStreamDecoder:
+    """
+    Incremental decoder of the messages received on a stream socket, in any mix of the JSON and msgpack encodings.
+    Data is fed as it is received, whatever the boundaries of the reads: messages split over several reads are
+    decoded once complete, and several messages received in one read are all decoded.
+    JSON messages do not need to be newline terminated, so Test Agents sending back to back JSON documents are
+    supported: a JSON object or array is decoded as soon as its closing bracket is received, and a complete line
+    that is not a JSON document is dropped.
+    """
+
+    def __init__(self):
+        self.json_decoder = json.JSONDecoder()
+        self.pending = bytearray()
+        # Encoding of the last message received, used to answer in kind
+        self.encoding: str = ENCODING_JSON
+        # Whether the pending data starts with an incomplete JSON message without newline, scanned up to
+        # scanned_length bytes, where it was scan_depth objects or arrays deep, and inside a string if scan_in_string
+        self.incomplete = False
+        self.scanned_length = 0
+        self.scan_depth = 0
+        self.scan_in_string = False
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        """
+        Adds received data and decodes the messages it completes.
+
+        :param data: The bytes received from the socket.
+        :return: The complete messages, in the order they were sent.
+        """
+        self.pending += data
+        messages: List[Dict[str, Any]] = []
+        position = 0
+        length = len(self.pending)
+        while True:
+            # Skip the delimiters and any other whitespace between messages
+            while position < length and self.pending[position] in WHITESPACE:
+                position += 1
+            if position == length:
+                break
+            incomplete: bool = self.incomplete
+            self.incomplete = False
+
+            if self.pending[position] == BINARY_MESSAGE_MARKER:
+                if length - position < BINARY_MESSAGE_HEADER.size:
+                    break
+                _, size = BINARY_MESSAGE_HEADER.unpack_from(self.pending, position)
+                end: int = position + BINARY_MESSAGE_HEADER.size + size
+                if end > length:
+                    break
+                body: bytearray = self.pending[position + BINARY_MESSAGE_HEADER.size : end]
+                position = end
+                if msgpack is None:
+                    logger.error(f"Dropping msgpack message of {size} bytes, msgpack is not installed")
+                    continue
+                try:
+                    messages.append(msgpack.unpackb(body))
+                except Exception as e:
+                    logger.error(f"Dropping malformed msgpack message {bytes(body)!r}: {e}")
+                    continue
+                self.encoding = ENCODING_MSGPACK
+                continue
+
+            newline: int = self.pending.find(MESSAGE_DELIMITER, position)
+            if newline == -1:
+                # Without newline, a message is decoded once the scan finds its closing brace, and the scan of an
+                # incomplete message resumes where it stopped, keeping large messages linear to decode
+                if not incomplete:
+                    self.scanned_length = 0
+                    self.scan_depth = 0
+                    self.scan_in_string = False
+                end = self._scan_json_document(position)
+                if end == -1:
+                    self.incomplete = True
+                    break
+                self._decode_json(self.pending[position:end], messages)
+                position = end
+                continue
+
+            # Several back to back JSON documents may share a line
+            self._decode_json(self.pending[position:newline], messages)
+            position = newline + 1
+
+        del self.pending[:position]
+        if len(self.pending) > MAX_PENDING_MESSAGE_SIZE:
+            logger.error(f"Dropping {len(self.pending)} bytes not forming a message")
+            self.pending.clear()
+            self.incomplete = False
+        return messages
+
+    def _scan_json_document(self, start: int) -> int:
+        """
+        Scans the pending data for the end of the JSON object or array starting at start, resuming the scan state.
+        Multi-byte UTF-8 characters never contain ASCII bytes, so the scan runs on the bytes.
+
+        :param start: The position of the first byte of the message.
+        :return: The position following the message, -1 if it is not complete yet.
+        """
+        if self.pending[start] not in JSON_OPENING_BYTES:
+            # Not an object or array: only a newline can end it
+            return -1
+        length = len(self.pending)
+        index: int = start + self.scanned_length
+        while True:
+            match = JSON_STRUCTURE_PATTERN.search(self.pending, index)
+            if match is None:
+                self.scanned_length = length - start
+                return -1
+            byte: int = self.pending[match.start()]
+            index = match.end()
+            if self.scan_in_string:
+                if byte == BACKSLASH:
+                    if index == length:
+                        # The escaped byte is still to be received
+                        self.scanned_length = match.start() - start
+                        return -1
+                    index += 1
+                elif byte == QUOTE:
+                    self.scan_in_string = False
+            elif byte == QUOTE:
+                self.scan_in_string = True
+            elif byte in JSON_OPENING_BYTES:
+                self.scan_depth += 1
+            elif byte in JSON_CLOSING_BYTES:
+                self.scan_depth -= 1
+                if self.scan_depth == 0:
+                    return index
+
+    def _decode_json(self, encoded: bytearray, messages: List[Dict[str, Any]]):
+        """
+        Decodes the back to back JSON documents of a complete line or message, dropping what is malformed.
+
+        :param encoded: The UTF-8 encoded documents.
+        :param messages: The list the decoded messages are appended to.
+        """
+        try:
+            text: str = encoded.decode("utf-8")
+        except UnicodeDecodeError:
+            logger.error(f"Dropping message that is not UTF-8 encoded {bytes(encoded)!r}")
+            return
+        position = 0
+        while position < len(text):
+            try:
+                message, position = self.json_decoder.raw_decode(text, position)
+            except json.JSONDecodeError as e:
+                logger.error(f"Dropping malformed message {text[position:]!r}: {e}")
+                return
+            messages.append(message)
+            self.encoding = ENCODING_JSON
+            while position < len(text) and text[position].isspace():
+                position += 1
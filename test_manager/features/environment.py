@@ -15,9 +15,11 @@ SPDX-FileType: SOURCE
 SPDX-License-Identifier: Apache-2.0
 """
 
+import os
 import random
 import sys
 import time
+from collections import Counter
 from threading import Thread
 
 import git
@@ -27,10 +29,20 @@ from behave.runner import Context
 repo = git.Repo(".", search_parent_directories=True)
 sys.path.insert(0, repo.working_tree_dir)
 
+from dispatcher.async_dispatcher import AsyncDispatcher
 from dispatcher.dispatcher import Dispatcher
+from dispatcher.endpoint import DISPATCHER_ENDPOINT_ENV
+from dispatcher.sharded_dispatcher import ShardedDispatcher
+from dispatcher.tracing import configure_tracing
 from test_manager.features.utils import loggerutils
+from test_manager.features.utils.agentutils import PYTHON_TA_PATH, agent_pool_name, create_command, create_subprocess
+from test_manager.metrics import METRICS_FORMAT_JSON
 from test_manager.testmanager import TestManager
 
+# Test Agents started ahead of time and recycled between features. Only the python Test Agent announces the release
+# capability, the other Test Agents are started by the first step needing them
+POOLED_TA_PATHS = {"python": PYTHON_TA_PATH}
+
 
 def environment_generate_uri(transport_name: str) -> dict:
     """Generate a random URI for the test environment.
@@ -68,6 +80,8 @@ def before_all(context):
 
     loggerutils.setup_logging()
     loggerutils.setup_formatted_logging(context)
+    if context.config.userdata.get("trace"):
+        configure_tracing(context.config.userdata["trace"])
 
     context.logger.info("Setting up Test Environment...")
 
@@ -109,7 +123,16 @@ def before_all(context):
 
     if "socket" in all_transports:
         context.logger.info("Creating Dispatcher...")
-        dispatcher = Dispatcher()
+        if context.config.userdata.get("dispatcher_endpoint"):
+            # Inherited by the test agent processes, so their socket transports connect to the same endpoint
+            os.environ[DISPATCHER_ENDPOINT_ENV] = context.config.userdata["dispatcher_endpoint"]
+        if context.config.userdata.get("dispatcher") == "asyncio":
+            dispatcher = AsyncDispatcher()
+        elif context.config.userdata.get("dispatcher") == "sharded":
+            workers = context.config.userdata.get("dispatcher_workers")
+            dispatcher = ShardedDispatcher(int(workers) if workers else None)
+        else:
+            dispatcher = Dispatcher()
         thread = Thread(target=dispatcher.listen_for_client_connections)
         thread.start()
         context.dispatcher = dispatcher
@@ -117,9 +140,36 @@ def before_all(context):
     else:
         context.logger.info("No Dispatcher Required...")
 
+    if context.config.userdata.get("agent_pool") != "off":
+        start_agent_pools(context, all_languages, all_transports)
+
     context.logger.info("Created Test Manager...")
 
 
+def start_agent_pools(context: Context, all_languages: list, all_transports: list):
+    """Start an idle Test Agent for each uE of a pooled SDK, grouped by SDK and transport.
+    :param context: Holds contextual information during the running of tests
+    :param all_languages: The SDK of each uE.
+    :param all_transports: The transport of each uE.
+    """
+    for (sdk, transport), size in Counter(zip(all_languages, all_transports)).items():
+        if sdk not in POOLED_TA_PATHS:
+            continue
+        context.logger.info(f"Starting {size} {sdk} Test Agents over {transport}...")
+        context.tm.start_agent_pool(
+            agent_pool_name(sdk, transport),
+            size,
+            lambda name, sdk=sdk, transport=transport: context.ues.setdefault(sdk, []).append(
+                create_subprocess(create_command(context, POOLED_TA_PATHS[sdk], transport, name), name)
+            ),
+        )
+
+
+def after_feature(context: Context, feature):
+    # Give the pooled Test Agents back to their pool, where the next feature acquires them
+    context.tm.release_test_agents()
+
+
 def after_all(context: Context):
     context.ue = None
     context.action = None
@@ -131,6 +181,12 @@ def after_all(context: Context):
         context.tm.close_test_agent(ue[0])
     context.tm.close()
 
+    if context.config.userdata.get("metrics"):
+        context.tm.metrics.dump(
+            context.config.userdata["metrics"], context.config.userdata.get("metrics_format", METRICS_FORMAT_JSON)
+        )
+        context.logger.info(f"Request latencies written to {context.config.userdata['metrics']}")
+
     context.logger.info(context.dispatcher)
     if context.dispatcher is not None:
         context.logger.info("Closing Dispatcher...")
@@ -18,14 +18,9 @@ SPDX-License-Identifier: Apache-2.0
 import base64
 import binascii
 import codecs
-import datetime
 import json
-import os
 import re
-import subprocess
-import sys
-import time
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Union
 
 import parse
 from behave import given, register_type, then, when
@@ -33,60 +28,15 @@ from behave.runner import Context
 from hamcrest import assert_that, equal_to
 from uprotocol.v1.ucode_pb2 import UCode
 
-PYTHON_TA_PATH = "/test_agent/python/testagent.py"
-JAVA_TA_PATH = "/test_agent/java/target/tck-test-agent-java-jar-with-dependencies.jar"
-RUST_TA_PATH = "/test_agent/rust/target/debug/rust_tck"
-CPP_TA_PATH = "/test_agent/cpp/build/bin/test_agent_cpp"
-
-
-def create_command(context, filepath_from_root_repo: str, transport_to_send: str, sdk_name: str) -> List[str]:
-    command: List[str] = []
-
-    full_path = os.path.abspath(os.path.dirname(os.getcwd()) + "/" + filepath_from_root_repo)
-
-    if filepath_from_root_repo.endswith(".jar"):
-        command.append("java")
-        command.append("-jar")
-    elif filepath_from_root_repo.endswith(".py"):
-        if sys.platform == "win32":
-            command.append("python")
-        elif sys.platform == "linux" or sys.platform == "linux2" or sys.platform == "darwin":
-            command.append("python3")
-    elif os.access(full_path, os.X_OK):
-        # This is an executable file
-        pass
-    elif not filepath_from_root_repo.endswith("rust_tck"):
-        raise Exception("only accept .jar, .py, and executable files")
-
-    command.append(full_path)
-
-    command.append("--transport")
-    command.append(transport_to_send)
-    command.append("--sdkname")
-    command.append(sdk_name)
-    return command
-
-
-def create_subprocess(command: List[str]) -> subprocess.Popen:
-    # Generate a unique log file name based on the current timestamp
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_filename = f"process_{timestamp}.log"
-
-    # Construct the full log file path
-    log_dir = 'logs'
-    os.makedirs(log_dir, exist_ok=True)  # Create log directory if it doesn't exist
-    log_filepath = os.path.join(log_dir, log_filename)
-
-    with open(log_filepath, 'w') as logfile:
-        if sys.platform == "win32":
-            process = subprocess.Popen(command, shell=True, stdout=logfile, stderr=logfile)
-        elif sys.platform == "linux" or sys.platform == "linux2" or sys.platform == "darwin":
-            process = subprocess.Popen(command, stdout=logfile, stderr=logfile)
-        else:
-            print(sys.platform)
-            raise Exception("only handle Windows and Linux commands for now")
-
-    return process
+from test_manager.features.utils.agentutils import (
+    CPP_TA_PATH,
+    JAVA_TA_PATH,
+    PYTHON_TA_PATH,
+    RUST_TA_PATH,
+    agent_pool_name,
+    create_command,
+    create_subprocess,
+)
 
 
 def cast_data_to_jsonable_bytes(value: str):
@@ -141,6 +91,31 @@ def parse_nullable_string(text):
 register_type(NullableString=parse_nullable_string)
 
 
+def start_test_agent(context, sdk_name: str, base_sdk_name: str, transport: str, source: Dict[str, Any]):
+    context.logger.info(f"Creating {sdk_name} process...")
+
+    sdk_paths = {"python": PYTHON_TA_PATH, "java": JAVA_TA_PATH, "rust": RUST_TA_PATH, "cpp": CPP_TA_PATH}
+    if base_sdk_name in sdk_paths:
+        run_command = create_command(context, sdk_paths[base_sdk_name], transport, sdk_name)
+        # End scrtipt after priting the command
+        context.logger.info(run_command)
+    else:
+        raise ValueError("Invalid SDK name")
+
+    process = create_subprocess(run_command, sdk_name)
+    if base_sdk_name in ["python", "java", "cpp", "rust"]:
+        context.ues.setdefault(base_sdk_name, []).append(process)
+    else:
+        raise ValueError("Invalid SDK name")
+
+    context.logger.info(f"Created {sdk_name} process...")
+
+    context.logger.info(f"Waiting for {sdk_name} to connect...")
+    context.tm.wait_for_sdk_connection(sdk_name)
+
+    return context.tm.request(sdk_name, "initialize_transport", source)
+
+
 @given('"{sdk_name}" creates data for "{command}"')
 @when('"{sdk_name}" creates data for "{command}"')
 def create_sdk_data(context, sdk_name: str, command: str):
@@ -154,33 +129,16 @@ def create_sdk_data(context, sdk_name: str, command: str):
         transport = context.ue_tracker[int(ue_number) - 1][1]
 
     if not context.tm.has_sdk_connection(sdk_name):
-        context.logger.info(f"Creating {sdk_name} process...")
-
         base_sdk_name = re.sub(r"_\d+", "", sdk_name)
         context.logger.info(f"base_sdk_name: {base_sdk_name}")
-        sdk_paths = {"python": PYTHON_TA_PATH, "java": JAVA_TA_PATH, "rust": RUST_TA_PATH, "cpp": CPP_TA_PATH}
-        if base_sdk_name in sdk_paths:
-            run_command = create_command(context, sdk_paths[base_sdk_name], transport, sdk_name)
-            # End scrtipt after priting the command
-            context.logger.info(run_command)
-        else:
-            raise ValueError("Invalid SDK name")
-
-        process = create_subprocess(run_command)
-        if base_sdk_name in ["python", "java", "cpp", "rust"]:
-            context.ues.setdefault(base_sdk_name, []).append(process)
-        else:
-            raise ValueError("Invalid SDK name")
-
-        context.logger.info(f"Created {sdk_name} process...")
 
-        while not context.tm.has_sdk_connection(sdk_name):
-            time.sleep(1)
-            context.logger.info(f"Waiting for {sdk_name} to connect...")
-
-        response_json: Dict[str, Any] = context.tm.request(
-            sdk_name, "initialize_transport", context.ue_tracker[int(ue_number) - 1][2]
+        # A Test Agent started ahead of time only needs to be given its name and source
+        source: Dict[str, Any] = context.ue_tracker[int(ue_number) - 1][2]
+        response_json: Optional[Dict[str, Any]] = context.tm.acquire_test_agent(
+            agent_pool_name(base_sdk_name, transport), sdk_name, source
         )
+        if response_json is None:
+            response_json = start_test_agent(context, sdk_name, base_sdk_name, transport, source)
         context.logger.info(f"Response Json {command} -> {response_json}")
 
         try:
@@ -379,6 +337,34 @@ def send_command_request(context, command: str):
     context.response_data = response_json["data"]
 
 
+@when('sends a batch of "{command}" requests with the following values')
+def send_batch_request(context, command: str):
+    # Each table row is one request, with the row values set over the data created so far
+    requests: List[Dict[str, Any]] = [unflatten_dict({**context.json_dict, **row.as_dict()}) for row in context.table]
+    context.logger.info(f"Json requests for {command} -> {requests}")
+
+    responses: List[Optional[Dict[str, Any]]] = context.tm.request_batch(
+        context.ue, [(command, request) for request in requests]
+    )
+    context.logger.info(f"Response Jsons {command} -> {responses}")
+    if None in responses:
+        raise AssertionError(f"Missing response to a batched {command} request")
+    context.batch_response_data = [response["data"] for response in responses]
+
+
+@then("receives validation results in order")
+def receive_batch_validation_results(context):
+    actual_results: List[str] = [response_data["result"] for response_data in context.batch_response_data]
+    expected_results: List[str] = [row["result"].strip() for row in context.table]
+    assert_that(actual_results, equal_to(expected_results))
+
+
+@then("the serialized uuids received in order are")
+def serialized_uuids_received(context):
+    expected_uuids: List[str] = [row["uuid"] for row in context.table]
+    assert_that(context.batch_response_data, equal_to(expected_uuids))
+
+
 @then('the status received with "{field_name}" is "{expected_value}"')
 def receive_status(context, field_name: str, expected_value: str):
     try:
@@ -24,14 +24,14 @@
 
 Feature: UUID serialization
 
-  Scenario Outline: Testing uuid serializer
+  Scenario: Testing uuid serializer
     Given "uE1" creates data for "uuid_serialize"
-    And sets "lsb" to "<lsb>"
-    And sets "msb" to "<msb>"
 
-    When sends "uuid_serialize" request
-    Then the serialized uuid received is "<expected_uuid>"
-
-    Examples:
-      | lsb                  | msb                | expected_uuid                        |
-      | 11155833020022798372 | 112128268635242497 | 018e5c10-f548-8001-9ad1-7b068c083824 |
\ No newline at end of file
+    When sends a batch of "uuid_serialize" requests with the following values
+      | lsb                  | msb                |
+      | 11155833020022798372 | 112128268635242497 |
+      | 9823657842651164800  | 112159064549998593 |
+    Then the serialized uuids received in order are
+      | uuid                                 |
+      | 018e5c10-f548-8001-9ad1-7b068c083824 |
+      | 018e7813-30d7-c001-8854-a4c28a33f080 |
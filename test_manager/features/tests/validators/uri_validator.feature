@@ -23,7 +23,7 @@
 # -------------------------------------------------------------------------
 
 Feature: URI Validation
-  Scenario Outline: UUri Validation for an empty UUri
+  Scenario: UUri Validation for an empty UUri
       Given "uE1" creates data for "uri_deserialize"
 
       When sends a "uri_deserialize" request with serialized input ""
@@ -36,19 +36,22 @@ Feature: URI Validation
         | resource_id          | 0                             | int                 |
 
       When "uE2" creates data for "uri_validate"
-      And sets "validation_type" to "<validation_type>"
       And sets "uuri" to previous response data
-      And sends "uri_validate" request
-
-      Then receives validation result as "<bool_result>"
-
-      Examples:
-        | validation_type             | bool_result |
-        | is_empty                    | True        |
-        | is_rpc_method               | False       |
-        | is_rpc_response             | False       |
-        | is_default_resource_id      | False       |
-        | is_topic                    | False       |
+      And sends a batch of "uri_validate" requests with the following values
+        | validation_type             |
+        | is_empty                    |
+        | is_rpc_method               |
+        | is_rpc_response             |
+        | is_default_resource_id      |
+        | is_topic                    |
+
+      Then receives validation results in order
+        | validation_type             | result |
+        | is_empty                    | True   |
+        | is_rpc_method               | False  |
+        | is_rpc_response             | False  |
+        | is_default_resource_id      | False  |
+        | is_topic                    | False  |
 
 
   Scenario Outline: UUri validation for a UUri with only authority_name
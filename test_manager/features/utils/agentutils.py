@@ -0,0 +1,83 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import datetime
+import os
+import subprocess
+import sys
+from typing import List
+
+PYTHON_TA_PATH = "/test_agent/python/testagent.py"
+JAVA_TA_PATH = "/test_agent/java/target/tck-test-agent-java-jar-with-dependencies.jar"
+RUST_TA_PATH = "/test_agent/rust/target/debug/rust_tck"
+CPP_TA_PATH = "/test_agent/cpp/build/bin/test_agent_cpp"
+
+
+def create_command(context, filepath_from_root_repo: str, transport_to_send: str, sdk_name: str) -> List[str]:
+    command: List[str] = []
+
+    full_path = os.path.abspath(os.path.dirname(os.getcwd()) + "/" + filepath_from_root_repo)
+
+    if filepath_from_root_repo.endswith(".jar"):
+        command.append("java")
+        command.append("-jar")
+    elif filepath_from_root_repo.endswith(".py"):
+        if sys.platform == "win32":
+            command.append("python")
+        elif sys.platform == "linux" or sys.platform == "linux2" or sys.platform == "darwin":
+            command.append("python3")
+    elif os.access(full_path, os.X_OK):
+        # This is an executable file
+        pass
+    elif not filepath_from_root_repo.endswith("rust_tck"):
+        raise Exception("only accept .jar, .py, and executable files")
+
+    command.append(full_path)
+
+    command.append("--transport")
+    command.append(transport_to_send)
+    command.append("--sdkname")
+    command.append(sdk_name)
+    return command
+
+
+def create_subprocess(command: List[str], sdk_name: str) -> subprocess.Popen:
+    # Generate a unique log file name based on the Test Agent name and the current timestamp,
+    # as several Test Agents can be started within the same second
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_filename = f"process_{sdk_name}_{timestamp}.log"
+
+    # Construct the full log file path
+    log_dir = 'logs'
+    os.makedirs(log_dir, exist_ok=True)  # Create log directory if it doesn't exist
+    log_filepath = os.path.join(log_dir, log_filename)
+
+    with open(log_filepath, 'w') as logfile:
+        if sys.platform == "win32":
+            process = subprocess.Popen(command, shell=True, stdout=logfile, stderr=logfile)
+        elif sys.platform == "linux" or sys.platform == "linux2" or sys.platform == "darwin":
+            process = subprocess.Popen(command, stdout=logfile, stderr=logfile)
+        else:
+            print(sys.platform)
+            raise Exception("only handle Windows and Linux commands for now")
+
+    return process
+
+
+def agent_pool_name(sdk_name: str, transport: str) -> str:
+    """Name of the Test Manager's pool of Test Agents of an SDK using a transport."""
+    return f"{sdk_name}_{transport}"
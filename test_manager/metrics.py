@@ -0,0 +1,178 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import json
+from collections import defaultdict
+from threading import Lock
+from typing import Any, Dict, List, Tuple
+
+# Latencies measured by the Test Manager, per Test Agent and action:
+#   round_trip      request sent -> response received, as seen by the Test Manager
+#   agent_handle    request received -> response sent, as reported by the Test Agent in its response timestamps
+#   channel         round_trip minus agent_handle: encoding, socket transfer and queueing on both ends
+#   onreceive_wait  time a step waited for a message received by a Test Agent's listener
+ROUND_TRIP = "round_trip"
+AGENT_HANDLE = "agent_handle"
+CHANNEL = "channel"
+ONRECEIVE_WAIT = "onreceive_wait"
+
+METRICS_FORMAT_JSON = "json"
+METRICS_FORMAT_PROMETHEUS = "prometheus"
+PROMETHEUS_PREFIX = "uprotocol_tck"
+REPORTED_PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+# Values are recorded in microseconds, in buckets 2^-(SUB_BUCKET_BITS - 1) wide relative to their value:
+# up to 1.6% error, whatever the magnitude, like an HDR histogram with 2 significant digits
+SUB_BUCKET_BITS: int = 7
+SUB_BUCKET_COUNT: int = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF_COUNT: int = SUB_BUCKET_COUNT >> 1
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of latencies, with constant relative precision and memory growing with the
+    logarithm of the recorded range only.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    @staticmethod
+    def _bucket(microseconds: int) -> int:
+        if microseconds < SUB_BUCKET_COUNT:
+            return microseconds
+        shift: int = microseconds.bit_length() - SUB_BUCKET_BITS
+        return shift * SUB_BUCKET_HALF_COUNT + (microseconds >> shift)
+
+    @staticmethod
+    def _highest_equivalent_value(bucket: int) -> int:
+        if bucket < SUB_BUCKET_COUNT:
+            return bucket
+        shift: int = bucket // SUB_BUCKET_HALF_COUNT - 1
+        return ((bucket - shift * SUB_BUCKET_HALF_COUNT + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        """
+        Records a latency.
+
+        :param seconds: The latency in seconds, negative values being recorded as 0.
+        """
+        seconds = max(seconds, 0.0)
+        self.counts[self._bucket(int(seconds * 1_000_000))] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Returns the latency below which a percentage of the recorded latencies fall.
+
+        :param percentile: The percentage, between 0 and 100.
+        :return: The latency in seconds, 0 if nothing was recorded.
+        """
+        if self.count == 0:
+            return 0.0
+        rank: float = max(1.0, percentile / 100 * self.count)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._highest_equivalent_value(bucket) / 1_000_000, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        summary: Dict[str, float] = {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else 0.0,
+        }
+        for percentile in REPORTED_PERCENTILES:
+            summary[f"p{percentile:g}"] = self.percentile(percentile)
+        return summary
+
+
+class LatencyMetrics:
+    """
+    Latency histograms of the Test Manager, per metric, SDK and action.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str, str], LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.lock = Lock()
+
+    def record(self, metric: str, sdk: str, action: str, seconds: float):
+        """
+        Records a latency.
+
+        :param metric: The measured interval, e.g. ROUND_TRIP.
+        :param sdk: The SDK of the Test Agent involved, with its transport if the Test Agent is pooled.
+        :param action: The request action, or the message kind.
+        :param seconds: The latency in seconds.
+        """
+        with self.lock:
+            self.histograms[(metric, sdk, action)].record(seconds)
+
+    def to_json(self) -> str:
+        """
+        Summarizes every histogram as a JSON list, latencies being in seconds.
+        """
+        with self.lock:
+            entries: List[Dict[str, Any]] = [
+                {"metric": metric, "sdk": sdk, "action": action, **histogram.summary()}
+                for (metric, sdk, action), histogram in sorted(self.histograms.items())
+            ]
+        return json.dumps(entries, indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        Summarizes every histogram in the Prometheus text exposition format, as one summary per metric.
+        """
+        lines: List[str] = []
+        with self.lock:
+            by_metric: Dict[str, List[Tuple[str, str, LatencyHistogram]]] = defaultdict(list)
+            for (metric, sdk, action), histogram in sorted(self.histograms.items()):
+                by_metric[metric].append((sdk, action, histogram))
+            for metric, histograms in by_metric.items():
+                name = f"{PROMETHEUS_PREFIX}_{metric}_seconds"
+                lines.append(f"# TYPE {name} summary")
+                for sdk, action, histogram in histograms:
+                    labels = f'sdk="{sdk}",action="{action}"'
+                    for percentile in REPORTED_PERCENTILES:
+                        quantile = f"{percentile / 100:g}"
+                        lines.append(f'{name}{{{labels},quantile="{quantile}"}} {histogram.percentile(percentile):.6f}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str, metrics_format: str = METRICS_FORMAT_JSON):
+        """
+        Writes the summary of every histogram to a file.
+
+        :param path: The file path.
+        :param metrics_format: METRICS_FORMAT_JSON or METRICS_FORMAT_PROMETHEUS.
+        """
+        if metrics_format not in (METRICS_FORMAT_JSON, METRICS_FORMAT_PROMETHEUS):
+            raise ValueError(f"metrics_format must be {METRICS_FORMAT_JSON} or {METRICS_FORMAT_PROMETHEUS}")
+        with open(path, "w") as f:
+            f.write(self.to_json() if metrics_format == METRICS_FORMAT_JSON else self.to_prometheus())
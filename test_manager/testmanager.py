@@ -15,192 +15,332 @@ SPDX-FileType: SOURCE
 SPDX-License-Identifier: Apache-2.0
 """
 
-import json
+import asyncio
+import concurrent.futures
+import itertools
 import logging
-import selectors
+import re
 import socket
 import sys
+import time
 import uuid
-from collections import defaultdict, deque
-from threading import Lock
-from typing import Any, Deque, Dict, Tuple
+from collections import defaultdict
+from threading import Event
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from typing import Any as AnyType
 
-from multimethod import multimethod
+from test_manager.control_channel import ENCODING_JSON, MessageStreamDecoder, encode_message, negotiate_encoding
+from test_manager.metrics import AGENT_HANDLE, CHANNEL, ONRECEIVE_WAIT, ROUND_TRIP, LatencyMetrics
 
 logging.basicConfig(format="%(levelname)s| %(filename)s:%(lineno)s %(message)s")
 logger = logging.getLogger("File:Line# Debugger")
 logger.setLevel(logging.DEBUG)
 BYTES_MSG_LENGTH: int = 32767
+# Seconds to wait for a Test Agent's response before failing the request
+REQUEST_TIMEOUT: float = 30.0
+# Seconds to wait for the event loop to close the Test Manager
+CLOSE_TIMEOUT: float = 5.0
+# Unsolicited messages from Test Agents, queued per Test Agent instead of being correlated to a request
+ONRECEIVE_ACTION = "onreceive"
+# Runs a list of commands in a single round trip, on Test Agents advertising it in their initialize message
+BATCH_ACTION = "batch"
+# Gives a Test Agent its source URI, and its name when it comes from an agent pool
+INITIALIZE_TRANSPORT_ACTION = "initialize_transport"
+# Returns a pooled Test Agent to its pool, on Test Agents advertising it in their initialize message
+RELEASE_ACTION = "release"
+# Seconds to wait for a pooled Test Agent that is still starting
+AGENT_POOL_TIMEOUT: float = 10.0
+# Seconds to wait for a started Test Agent to connect and send its initialize message
+CONNECTION_TIMEOUT: float = 30.0
+
+
+class TestAgentSession:
+    """
+    Connection of a Test Agent to the Test Manager, named once the Test Agent has sent its initialize message.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.peername = writer.get_extra_info("peername")
+        self.name: Optional[str] = None
+        # Optional features, such as batch requests, the Test Agent announced when connecting
+        self.capabilities: Set[str] = set()
+        # Encoding of the messages sent to the Test Agent, negotiated from the encodings it announced
+        self.encoding: str = ENCODING_JSON
+        # One recv may hold part of a message or several
+        self.decoder = MessageStreamDecoder()
+        # Pending requests by test_id
+        self.pending_requests: Dict[str, asyncio.Future] = {}
+        # The pool the Test Agent was started for, if any
+        self.pool: Optional["TestAgentPool"] = None
+
+    def send(self, message: Dict[str, AnyType]):
+        self.writer.write(encode_message(message, self.encoding))
+
+
+class TestAgentPool:
+    """
+    Test Agents started ahead of time, connected and idle until a step assigns them a name.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # Names the launched Test Agents connect with, until they have connected
+        self.starting: Set[str] = set()
+        self.idle: asyncio.Queue = asyncio.Queue()
+        # Names the Test Agents were assigned by acquire_test_agent(), until they are released
+        self.assigned: Set[str] = set()
 
 
-def convert_json_to_jsonstring(j: Dict[str, AnyType]) -> str:
-    return json.dumps(j)
-
-
-def convert_str_to_bytes(string: str) -> bytes:
-    return str.encode(string)
-
-
-def send_socket_data(s: socket.socket, msg: bytes):
-    s.sendall(msg)
-
-
-def is_close_socket_signal(received_data: bytes) -> bool:
-    return received_data == b""
-
+class TestManager:
+    """
+    Server the Test Agents connect to, running on an asyncio event loop with one session per Test Agent.
 
-class TestAgentConnectionDatabase:
-    def __init__(self) -> None:
-        self.test_agent_address_to_name: Dict[tuple[str, int], str] = defaultdict(str)
-        self.test_agent_name_to_address: Dict[str, socket.socket] = {}
-        self.lock = Lock()
+    Step implementations either await the coroutine API (arequest(), aget_onreceive(), ...) on the Test Manager's
+    event loop, or call its synchronous facade (request(), get_onreceive(), ...) from any other thread, which blocks
+    until the coroutine has run on the event loop. listen_for_incoming_events() runs the event loop until close().
+    """
 
-    def add(self, test_agent_socket: socket.socket, test_agent_name: str):
-        test_agent_address: tuple[str, int] = test_agent_socket.getpeername()
+    def __init__(self, bdd_context, ip_addr: str, port: int):
+        self.bdd_context = bdd_context
+        self.sessions: Dict[str, TestAgentSession] = {}
+        self.onreceive_queues: Dict[str, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self.connected_events: Dict[str, asyncio.Event] = defaultdict(asyncio.Event)
+        self.agent_pools: Dict[str, TestAgentPool] = {}
+        # Pools of the launched Test Agents that have not connected yet, by the name they connect with
+        self.pooled_agents: Dict[str, TestAgentPool] = {}
+        self.pooled_agent_ids = itertools.count(1)
+        # Latencies of the requests and onreceive waits
+        self.metrics = LatencyMetrics()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.closed: Optional[asyncio.Event] = None
+        self.event_loop_stopped = Event()
+        self.event_loop_stopped.set()
+        # Created now, so that requests can be submitted before the event loop runs
+        self.loop = asyncio.new_event_loop()
+
+        # Create server socket, so address errors surface at construction
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if sys.platform != "win32":
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((ip_addr, port))
+        self.server_socket.listen(100)
+        self.server_socket.setblocking(False)
 
-        with self.lock:
-            self.test_agent_address_to_name[test_agent_address] = test_agent_name
-            self.test_agent_name_to_address[test_agent_name] = test_agent_socket
+        logger.info("TM server is running/listening")
 
-    @multimethod
-    def get(self, address: Tuple[str, int]) -> socket.socket:
-        test_agent_name: str = self.test_agent_address_to_name[address]
-        return self.test_agent_name_to_address[test_agent_name]
+    def listen_for_incoming_events(self):
+        """
+        Runs the Test Manager's event loop on the calling thread, serving Test Agents until close() is called.
+        """
+        self.event_loop_stopped.clear()
+        try:
+            self.loop.run_until_complete(self.serve())
+        finally:
+            # Let the sessions still reading from Test Agents end before closing the event loop
+            tasks: Set[asyncio.Task] = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self.loop.run_until_complete(asyncio.wait(tasks))
+            self.loop.close()
+            self.event_loop_stopped.set()
+
+    async def serve(self):
+        """
+        Accepts Test Agent connections until aclose() is called.
+        """
+        self.closed = asyncio.Event()
+        self.server = await asyncio.start_server(self._handle_test_agent, sock=self.server_socket)
+        await self.closed.wait()
 
-    @multimethod
-    def get(self, name: str) -> socket.socket:
-        return self.test_agent_name_to_address[name]
+    def _run(self, coroutine) -> Any:
+        """
+        Runs a coroutine on the Test Manager's event loop and blocks until it is done.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
 
-    def contains(self, test_agent_name: str):
-        return test_agent_name in self.test_agent_name_to_address
+    async def _handle_test_agent(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Receives messages from a Test Agent until it disconnects.
 
-    @multimethod
-    def close(self, test_agent_name: str):
-        if test_agent_name is None or test_agent_name == "":
+        :param reader: The stream the Test Agent's messages are read from.
+        :param writer: The stream requests to the Test Agent are written to.
+        """
+        session = TestAgentSession(reader, writer)
+        logger.info(f"accepted conn. {session.peername}")
+        try:
+            while True:
+                recv_data: bytes = await reader.read(BYTES_MSG_LENGTH)
+                if recv_data == b"":
+                    break
+                for json_data in session.decoder.feed(recv_data):
+                    logger.info("Received from test agent: %s", json_data)
+                    if json_data.get("test_id") is not None:
+                        json_data["test_id"] = json_data["test_id"].strip('"')
+                    self._process_receive_message(json_data, session)
+        except Exception as e:
+            logger.error(f"Error receiving from test agent {session.peername}: {e}")
+        finally:
+            self._close_session(session)
+
+    def _process_receive_message(self, response_json: Dict[str, Any], session: TestAgentSession):
+        logger.info(f"Processing response_json: {response_json}")
+        if response_json["action"] == "initialize":
+            session.name = response_json["data"]["SDK_name"].lower().strip()
+            logger.info(f"New TA name: {session.name}")
+            session.capabilities = set(response_json["data"].get("capabilities", []))
+            session.encoding = negotiate_encoding(response_json["data"].get("encodings", []))
+            self.sessions[session.name] = session
+            self.connected_events[session.name].set()
+            pool: Optional[TestAgentPool] = self.pooled_agents.pop(session.name, None)
+            if pool is not None:
+                session.pool = pool
+                pool.starting.discard(session.name)
+                pool.idle.put_nowait(session)
             return
-        test_agent_socket: socket.socket = self.get(test_agent_name)
-        self.close(test_agent_socket)
 
-    @multimethod
-    def close(self, test_agent_socket: socket.socket):
-        test_agent_address: tuple[str, int] = test_agent_socket.getpeername()
-        test_agent_name: str = self.test_agent_address_to_name.get(test_agent_address, None)
-
-        if test_agent_name is None:
+        action_type: str = response_json["action"]
+        if action_type == ONRECEIVE_ACTION:
+            self.onreceive_queues[response_json["ue"]].put_nowait(response_json)
             return
 
-        with self.lock:
-            del self.test_agent_address_to_name[test_agent_address]
-            del self.test_agent_name_to_address[test_agent_name]
-
-        test_agent_socket.close()
-
-
-class DictWithQueue:
-    def __init__(self) -> None:
-        self.key_to_queue: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
-        self.lock = Lock()
-
-    def append(self, key: str, msg: Dict[str, Any]) -> None:
-        with self.lock:
-            self.key_to_queue[key].append(msg)
-            logger.info(f"self.key_to_queue append {self.key_to_queue}")
-
-    def contains(self, key: str, inner_key: str, inner_expected_value: str) -> bool:
-        queue: Deque[Dict[str, Any]] = self.key_to_queue[key]
-        if len(queue) == 0:
-            return False
-
-        response_json: Dict[str, Any] = queue[0]
-        incoming_req_id: str = response_json[inner_key]
+        future: Optional[asyncio.Future] = session.pending_requests.pop(response_json.get("test_id"), None)
+        if future is None or future.done():
+            logger.warning(f"Discarding {action_type} response to an unknown or expired request: {response_json}")
+            return
+        future.set_result(response_json)
 
-        return incoming_req_id == inner_expected_value
+    def has_sdk_connection(self, test_agent_name: str) -> bool:
+        return test_agent_name in self.sessions
 
-    def popleft(self, key: str) -> Any:
-        with self.lock:
-            onreceive: Any = self.key_to_queue[key].popleft()
-            logger.info(f'self.key_to_queue popleft {onreceive["action"]} {self.key_to_queue}')
-        return onreceive
+    async def await_sdk_connection(self, test_agent_name: str, timeout: Optional[float] = CONNECTION_TIMEOUT):
+        """
+        Waits until a Test Agent has connected and sent its initialize message.
 
+        :param test_agent_name: The name of the Test Agent.
+        :param timeout: Seconds to wait at most, None to wait forever.
+        :raises TimeoutError: If the Test Agent did not connect in time.
+        """
+        try:
+            await asyncio.wait_for(self.connected_events[test_agent_name].wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"{test_agent_name} did not connect")
+            raise TimeoutError(f"{test_agent_name} did not connect within {timeout} seconds") from None
 
-class TestManager:
-    def __init__(self, bdd_context, ip_addr: str, port: int):
-        self.exit_manager = False
-        self.socket_event_receiver = selectors.DefaultSelector()
-        self.connected_test_agent_sockets: Dict[str, socket.socket] = {}
-        self.test_agent_database = TestAgentConnectionDatabase()
-        self.action_type_to_response_queue = DictWithQueue()
-        self.lock = Lock()
-        self.bdd_context = bdd_context
+    def wait_for_sdk_connection(self, test_agent_name: str, timeout: Optional[float] = CONNECTION_TIMEOUT):
+        """Blocking version of await_sdk_connection()"""
+        self._run(self.await_sdk_connection(test_agent_name, timeout))
 
-        # Create server socket
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        if sys.platform != "win32":
-            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server.bind((ip_addr, port))
-        self.server.listen(100)
-        self.server.setblocking(False)
+    async def arequest(
+        self,
+        test_agent_name: str,
+        action: str,
+        data: Dict[str, AnyType],
+        payload: Dict[str, AnyType] = None,
+    ) -> Dict[str, Any]:
+        """Sends a request message to sdk Test Agent (ex: Java, Rust, C++ Test Agent) and waits for its response.
+        Several requests can be in flight at once, their responses being matched by test_id.
 
-        logger.info("TM server is running/listening")
+        :return: The response json.
+        :raises TimeoutError: If the Test Agent did not answer within REQUEST_TIMEOUT seconds.
+        :raises ConnectionError: If the Test Agent disconnected before answering.
+        """
+        # Get Test Agent's session
+        session: TestAgentSession = self.sessions[test_agent_name.lower().strip()]
 
-        # Register server socket for accepting connections
-        self.socket_event_receiver.register(self.server, selectors.EVENT_READ, self._accept_client_conn)
+        # Create a request json to send to specific Test Agent
+        request_json = {"data": data, "action": action, "test_id": str(uuid.uuid4())}
+        if payload is not None:
+            request_json["payload"] = payload
+        return await self._send_request(session, request_json)
 
-    def _accept_client_conn(self, server: socket.socket):
+    async def _send_request(self, session: TestAgentSession, request_json: Dict[str, AnyType]) -> Dict[str, Any]:
         """
-        Callback function for accepting test agent connections.
+        Sends a request message to a Test Agent and waits for its response, see arequest().
 
-        :param server: The server socket.
+        :param session: The session of the Test Agent.
+        :param request_json: The request, with its action and test_id.
         """
-        ta_socket, _ = server.accept()
-        logger.info(f"accepted conn. {ta_socket.getpeername()}")
-
-        # Register socket for receiving data
-        self.socket_event_receiver.register(ta_socket, selectors.EVENT_READ, self._receive_from_test_agent)
+        action: str = request_json["action"]
+        test_id: str = request_json["test_id"]
+        future: asyncio.Future = self.loop.create_future()
+        session.pending_requests[test_id] = future
+        sent: float = time.perf_counter()
+        try:
+            session.send(request_json)
+            logger.info(f"Sent to TestAgent{request_json}")
+            await session.writer.drain()
+
+            # Wait until get response
+            logger.info(f"Waiting test_id {test_id}")
+            try:
+                response_json: Dict[str, Any] = await asyncio.wait_for(future, REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(f"No response from {session.name} to {action} request {test_id}")
+                raise TimeoutError(f"No response to {action} request within {REQUEST_TIMEOUT} seconds") from None
+        finally:
+            session.pending_requests.pop(test_id, None)
+        logger.info(f"Received test_id {test_id}")
+        self._record_request_latency(
+            self._metrics_label(session.name), action, time.perf_counter() - sent, response_json
+        )
+        return response_json
 
-    def _receive_from_test_agent(self, test_agent: socket.socket):
+    def _metrics_label(self, test_agent_name: str) -> str:
         """
-        Callback function for receiving data from test agent sockets.
+        Label the latencies of a Test Agent are recorded under, so that the histograms do not grow with the names
+        given to the Test Agents.
 
-        :param test_agent: The client socket.
+        :param test_agent_name: The name of the Test Agent.
+        :return: The name of its pool, made of its SDK and transport, if it is pooled, otherwise its SDK.
         """
-        recv_data = test_agent.recv(BYTES_MSG_LENGTH)
-
-        if is_close_socket_signal(recv_data):
-            self.close_test_agent(test_agent)
-            return
-        json_data = json.loads(recv_data.decode("utf-8"))
-        logger.info("Received from test agent: %s", json_data)
-        if json_data.get("test_id") is not None:
-            json_data["test_id"] = json_data["test_id"].strip('"')
-        self._process_receive_message(json_data, test_agent)
+        session: Optional[TestAgentSession] = self.sessions.get(test_agent_name)
+        if session is not None and session.pool is not None:
+            return session.pool.name
+        return re.sub(r"_\d+$", "", test_agent_name)
 
-    def _process_receive_message(self, response_json: Dict[str, Any], ta_socket: socket.socket):
-        logger.info(f"Processing response_json: {response_json}")
-        if response_json["action"] == "initialize":
-            ta_name: str = response_json["data"]["SDK_name"].lower().strip()
-            logger.info(f"New TA name: {ta_name}")
-            self.test_agent_database.add(ta_socket, ta_name)
-            return
-
-        action_type: str = response_json["action"]
-        self.action_type_to_response_queue.append(action_type, response_json)
-
-    def has_sdk_connection(self, test_agent_name: str) -> bool:
-        return self.test_agent_database.contains(test_agent_name)
-
-    def listen_for_incoming_events(self):
+    def _record_request_latency(self, sdk: str, action: str, round_trip: float, response_json: Dict[str, Any]):
         """
-        Listens for Test Agent connections and messages, then creates a thread to start the init process
+        Records the latencies of a request, split into the Test Agent's handling and the channel
+        when the Test Agent reported its timestamps.
+
+        :param sdk: The metrics label of the Test Agent that answered.
+        :param action: The request action.
+        :param round_trip: Seconds between sending the request and receiving its response.
+        :param response_json: The response, whose optional "timestamps" hold the Test Agent's received and handled
+        times in nanoseconds of its own monotonic clock.
         """
+        self.metrics.record(ROUND_TRIP, sdk, action, round_trip)
+        timestamps: Optional[Dict[str, int]] = response_json.get("timestamps")
+        if not timestamps:
+            return
+        agent_handle: float = (timestamps["handled"] - timestamps["received"]) / 1e9
+        self.metrics.record(AGENT_HANDLE, sdk, action, agent_handle)
+        self.metrics.record(CHANNEL, sdk, action, round_trip - agent_handle)
+        if action == BATCH_ACTION:
+            for response in response_json["data"]:
+                if response.get("timestamps"):
+                    self.metrics.record(
+                        AGENT_HANDLE,
+                        sdk,
+                        response["action"],
+                        (response["timestamps"]["handled"] - response["timestamps"]["received"]) / 1e9,
+                    )
+
+    def submit_request(
+        self,
+        test_agent_name: str,
+        action: str,
+        data: Dict[str, AnyType],
+        payload: Dict[str, AnyType] = None,
+    ) -> concurrent.futures.Future:
+        """Sends a request message to sdk Test Agent without waiting for its response.
 
-        while not self.exit_manager:
-            # Wait until some registered file objects or sockets become ready, or the timeout expires.
-            events = self.socket_event_receiver.select(timeout=0)
-            for key, mask in events:
-                callback = key.data
-                callback(key.fileobj)
+        :return: A Future completed with the response json once the Test Agent answers.
+        """
+        return asyncio.run_coroutine_threadsafe(self.arequest(test_agent_name, action, data, payload), self.loop)
 
     def request(
         self,
@@ -208,60 +348,238 @@ class TestManager:
         action: str,
         data: Dict[str, AnyType],
         payload: Dict[str, AnyType] = None,
-    ):
+    ) -> Dict[str, Any]:
         """Sends a blocking request message to sdk Test Agent (ex: Java, Rust, C++ Test Agent)"""
-        # Get Test Agent's socket
+        return self.submit_request(test_agent_name, action, data, payload).result()
+
+    async def arequest_batch(
+        self,
+        test_agent_name: str,
+        commands: List[Tuple[str, Dict[str, AnyType]]],
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Sends several commands to sdk Test Agent and waits for all their responses.
+        Test Agents supporting batches run the commands in order from a single request message,
+        the commands are otherwise sent one request at a time, as these Test Agents read one message per receive.
+
+        :param test_agent_name: The name of the Test Agent running the commands.
+        :param commands: The (action, data) of each command.
+        :return: The response json of each command, in the order of the commands, None for commands without response.
+        """
         test_agent_name = test_agent_name.lower().strip()
-        test_agent_socket: socket.socket = self.test_agent_database.get(test_agent_name)
+        if BATCH_ACTION not in self.sessions[test_agent_name].capabilities:
+            return [await self.arequest(test_agent_name, action, data) for action, data in commands]
+
+        batch: List[Dict[str, AnyType]] = [
+            {"data": data, "action": action, "test_id": str(uuid.uuid4())} for action, data in commands
+        ]
+        response_json: Dict[str, Any] = await self.arequest(test_agent_name, BATCH_ACTION, batch)
+        responses: Dict[str, Dict[str, Any]] = {}
+        for response in response_json["data"]:
+            # Only the first response to a command answers it
+            if response["test_id"] in responses:
+                logger.warning(f"Discarding duplicate response to batched command {response['test_id']}")
+            else:
+                responses[response["test_id"]] = response
+        return [responses.get(command["test_id"]) for command in batch]
+
+    def request_batch(
+        self,
+        test_agent_name: str,
+        commands: List[Tuple[str, Dict[str, AnyType]]],
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Blocking version of arequest_batch()"""
+        return self._run(self.arequest_batch(test_agent_name, commands))
 
-        # Create a request json to send to specific Test Agent
-        test_id: str = str(uuid.uuid4())
-        request_json = {"data": data, "action": action, "test_id": test_id}
-        if payload is not None:
-            request_json["payload"] = payload
+    async def aget_onreceive(self, test_agent_name: str) -> Dict[str, Any]:
+        """
+        Waits for the next message a Test Agent's listener received.
 
-        # Pack json as binary
-        request_str: str = convert_json_to_jsonstring(request_json)
-        request_bytes: bytes = convert_str_to_bytes(request_str)
+        :param test_agent_name: The name of the Test Agent.
+        :return: The onreceive message.
+        :raises TimeoutError: If the Test Agent did not receive any message within REQUEST_TIMEOUT seconds.
+        """
+        started: float = time.perf_counter()
+        try:
+            onreceive: Dict[str, Any] = await asyncio.wait_for(
+                self.onreceive_queues[test_agent_name].get(), REQUEST_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"{test_agent_name} did not receive any message")
+            raise TimeoutError(
+                f"{test_agent_name} did not receive any message within {REQUEST_TIMEOUT} seconds"
+            ) from None
+        self.metrics.record(
+            ONRECEIVE_WAIT, self._metrics_label(test_agent_name), ONRECEIVE_ACTION, time.perf_counter() - started
+        )
+        return onreceive
 
-        send_socket_data(test_agent_socket, request_bytes)
-        logger.info(f"Sent to TestAgent{request_json}")
+    def get_onreceive(self, test_agent_name: str) -> Dict[str, Any]:
+        """Blocking version of aget_onreceive()"""
+        return self._run(self.aget_onreceive(test_agent_name))
 
-        # Wait until get response
-        logger.info(f"Waiting test_id {test_id}")
-        while not self.action_type_to_response_queue.contains(action, "test_id", test_id):
-            pass
-        logger.info(f"Received test_id {test_id}")
+    def _rename_session(self, session: TestAgentSession, test_agent_name: str):
+        """
+        Moves a Test Agent session to another name, the requests to the new name going to the Test Agent.
+        """
+        del self.sessions[session.name]
+        self.connected_events[session.name].clear()
+        session.name = test_agent_name
+        self.sessions[test_agent_name] = session
+        self.connected_events[test_agent_name].set()
+
+    async def _add_pooled_agents(self, pool_name: str, size: int) -> List[str]:
+        pool: TestAgentPool = self.agent_pools.setdefault(pool_name, TestAgentPool(pool_name))
+        names: List[str] = [f"{pool_name}_pool_{next(self.pooled_agent_ids)}" for _ in range(size)]
+        for name in names:
+            pool.starting.add(name)
+            self.pooled_agents[name] = pool
+        return names
+
+    def start_agent_pool(self, pool_name: str, size: int, launch: Callable[[str], AnyType]):
+        """
+        Starts Test Agents ahead of time, so that a step starting a uE assigns one of them a name and a source URI
+        with acquire_test_agent(), instead of waiting for a new Test Agent process to start and connect.
 
-        # Get response
-        response_json: Dict[str, Any] = self.action_type_to_response_queue.popleft(action)
-        return response_json
+        :param pool_name: The name of the pool, e.g. the SDK and transport of its Test Agents.
+        :param size: The number of Test Agents to start.
+        :param launch: Starts a Test Agent process, given the name it has to connect with.
+        """
+        for name in self._run(self._add_pooled_agents(pool_name, size)):
+            launch(name)
 
-    def _wait_for_onreceive(self, test_agent_name: str):
-        while not self.action_type_to_response_queue.contains("onreceive", "ue", test_agent_name):
-            pass
+    async def aacquire_test_agent(
+        self, pool_name: str, test_agent_name: str, source: Dict[str, AnyType]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Assigns an idle pooled Test Agent a name and a source URI, in a single initialize_transport request.
 
-    def get_onreceive(self, test_agent_name: str) -> Dict[str, Any]:
-        self._wait_for_onreceive(test_agent_name)
+        :param pool_name: The name of the pool.
+        :param test_agent_name: The name the Test Agent is given.
+        :param source: The source URI of the Test Agent's transport.
+        :return: The initialize_transport response, None if the pool has no Test Agent left to assign.
+        """
+        pool: Optional[TestAgentPool] = self.agent_pools.get(pool_name)
+        while pool is not None and (not pool.idle.empty() or pool.starting):
+            try:
+                session: TestAgentSession = await asyncio.wait_for(pool.idle.get(), AGENT_POOL_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"No Test Agent of pool {pool_name} connected within {AGENT_POOL_TIMEOUT} seconds")
+                return None
+            if self.sessions.get(session.name) is not session:
+                # Disconnected while idle
+                continue
+            self._rename_session(session, test_agent_name.lower().strip())
+            pool.assigned.add(session.name)
+            logger.info(f"Assigned pooled Test Agent {session.peername} to {session.name}")
+            request_json = {
+                "data": source,
+                "action": INITIALIZE_TRANSPORT_ACTION,
+                "test_id": str(uuid.uuid4()),
+                "sdk_name": session.name,
+            }
+            return await self._send_request(session, request_json)
+        return None
+
+    def acquire_test_agent(
+        self, pool_name: str, test_agent_name: str, source: Dict[str, AnyType]
+    ) -> Optional[Dict[str, Any]]:
+        """Blocking version of aacquire_test_agent()"""
+        return self._run(self.aacquire_test_agent(pool_name, test_agent_name, source))
+
+    async def arelease_test_agent(self, test_agent_name: str) -> bool:
+        """
+        Returns a pooled Test Agent to its pool, closing its transport, for a later acquire_test_agent() to reuse it.
+        Pooled Test Agents that cannot be released are closed.
 
-        return self.action_type_to_response_queue.popleft("onreceive")
+        :param test_agent_name: The name of the Test Agent.
+        :return: Whether the Test Agent came from a pool.
+        """
+        session: Optional[TestAgentSession] = self.sessions.get(test_agent_name)
+        if session is None or session.pool is None:
+            return False
+        session.pool.assigned.discard(test_agent_name)
+        if RELEASE_ACTION not in session.capabilities:
+            self._close_session(session)
+            return True
+
+        pool_name: str = f"{session.pool.name}_pool_{next(self.pooled_agent_ids)}"
+        request_json = {"data": {}, "action": RELEASE_ACTION, "test_id": str(uuid.uuid4()), "sdk_name": pool_name}
+        try:
+            await self._send_request(session, request_json)
+        except (TimeoutError, ConnectionError) as e:
+            logger.error(f"Unable to release {test_agent_name}, closing it: {e}")
+            self._close_session(session)
+            return True
+        # Messages received while the Test Agent had this name are not for the next Test Agent given the name
+        self.onreceive_queues.pop(test_agent_name, None)
+        self._rename_session(session, pool_name)
+        session.pool.idle.put_nowait(session)
+        return True
+
+    def release_test_agent(self, test_agent_name: str) -> bool:
+        """Blocking version of arelease_test_agent()"""
+        return self._run(self.arelease_test_agent(test_agent_name))
+
+    async def arelease_test_agents(self) -> List[str]:
+        """
+        Returns every Test Agent assigned by acquire_test_agent() to its pool, the Test Agents started without a pool
+        keep running.
 
-    @multimethod
-    def close_test_agent(self, test_agent_socket: socket.socket):
-        # Stop monitoring socket/fileobj. A file object shall be unregistered prior to being closed.
-        self.socket_event_receiver.unregister(test_agent_socket)
-        self.test_agent_database.close(test_agent_socket)
+        :return: The names of the released Test Agents.
+        """
+        names: List[str] = []
+        for pool in self.agent_pools.values():
+            names.extend(pool.assigned)
+            pool.assigned.clear()
+        for name in names:
+            await self.arelease_test_agent(name)
+        return names
+
+    def release_test_agents(self) -> List[str]:
+        """Blocking version of arelease_test_agents()"""
+        return self._run(self.arelease_test_agents())
+
+    def _close_session(self, session: TestAgentSession):
+        """
+        Forgets a Test Agent session, failing its pending requests, and closes its connection.
+        """
+        if session.name is not None and self.sessions.get(session.name) is session:
+            del self.sessions[session.name]
+            self.connected_events[session.name].clear()
+        for future in session.pending_requests.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Connection to {session.name} closed"))
+        session.pending_requests.clear()
+        session.writer.close()
+
+    async def aclose_test_agent(self, test_agent_name: str):
+        session: Optional[TestAgentSession] = self.sessions.get(test_agent_name)
+        if session is not None:
+            self._close_session(session)
 
-    @multimethod
     def close_test_agent(self, test_agent_name: str):
-        if self.test_agent_database.contains(test_agent_name):
-            test_agent: socket.socket = self.test_agent_database.get(test_agent_name)
-            self.close_test_agent(test_agent)
+        """Blocking version of aclose_test_agent()"""
+        self._run(self.aclose_test_agent(test_agent_name))
+
+    async def aclose(self):
+        """
+        Stops accepting Test Agent connections and ends serve().
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for session in list(self.sessions.values()):
+            self._close_session(session)
+        if self.closed is not None:
+            self.closed.set()
 
     def close(self):
-        """Close the selector / test manager's server,
-        BUT need to free its individual SDK TA connections using self.close_ta(sdk) first
+        """Close the test manager's server and stop its event loop,
+        BUT need to free its individual SDK TA connections using self.close_test_agent(sdk) first
         """
-        self.exit_manager = True
-        self.socket_event_receiver.close()
-        self.server.close()
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.aclose(), self.loop).result(timeout=CLOSE_TIMEOUT)
+        else:
+            self.server_socket.close()
+        if not self.event_loop_stopped.wait(timeout=CLOSE_TIMEOUT):
+            logger.error("Test Manager event loop did not stop in time")
@@ -0,0 +1,108 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import json
+
+import pytest
+
+from test_manager import control_channel
+from test_manager.control_channel import (
+    BINARY_MESSAGE_HEADER,
+    BINARY_MESSAGE_MARKER,
+    ENCODING_JSON,
+    ENCODING_MSGPACK,
+    MessageStreamDecoder,
+    encode_message,
+    negotiate_encoding,
+)
+
+MESSAGES = [
+    {"action": "uri_serialize", "test_id": "1", "data": {"authority_name": "a", "ue_id": 1}},
+    {"action": "send", "test_id": "2", "data": {"payload": "line\nbreak", "text": "é"}},
+    {"action": "batch", "test_id": "3", "data": [{"action": "uuid_serialize", "data": {"msb": 1, "lsb": 2}}]},
+]
+
+msgpack_required = pytest.mark.skipif(control_channel.msgpack is None, reason="msgpack is not installed")
+
+
+def feed_chunks(decoder: MessageStreamDecoder, stream: bytes, chunk_size: int):
+    messages = []
+    for i in range(0, len(stream), chunk_size):
+        messages += decoder.feed(stream[i : i + chunk_size])
+    return messages
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 100_000])
+def test_json_messages_split_and_merged_across_reads(chunk_size):
+    stream = b"".join(encode_message(message) for message in MESSAGES)
+    decoder = MessageStreamDecoder()
+    assert feed_chunks(decoder, stream, chunk_size) == MESSAGES
+    assert decoder.pending == bytearray()
+    assert decoder.encoding == ENCODING_JSON
+
+
+@msgpack_required
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 100_000])
+def test_mixed_encodings_split_and_merged_across_reads(chunk_size):
+    encodings = [ENCODING_MSGPACK, ENCODING_JSON, ENCODING_MSGPACK]
+    stream = b"".join(encode_message(message, encoding) for message, encoding in zip(MESSAGES, encodings))
+    decoder = MessageStreamDecoder()
+    assert feed_chunks(decoder, stream, chunk_size) == MESSAGES
+    # Answers go out in the encoding of the last message received
+    assert decoder.encoding == ENCODING_MSGPACK
+
+
+def test_back_to_back_json_documents_without_newline():
+    stream = b"".join(json.dumps(message).encode("utf-8") for message in MESSAGES)
+    assert MessageStreamDecoder().feed(stream) == MESSAGES
+
+
+def test_json_document_without_newline_is_decoded_once_complete():
+    decoder = MessageStreamDecoder()
+    assert decoder.feed(b'{"a":1}{"b":') == [{"a": 1}]
+    assert decoder.feed(b'"x}\\') == []
+    assert decoder.feed(b'""}') == [{"b": 'x}"'}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7])
+def test_back_to_back_json_documents_without_newline_split_across_reads(chunk_size):
+    stream = b"".join(json.dumps(message).encode("utf-8") for message in MESSAGES)
+    assert feed_chunks(MessageStreamDecoder(), stream, chunk_size) == MESSAGES
+
+
+def test_malformed_json_line_is_dropped():
+    stream = b'{"action": \n' + encode_message(MESSAGES[0])
+    assert MessageStreamDecoder().feed(stream) == [MESSAGES[0]]
+
+
+@msgpack_required
+def test_malformed_msgpack_message_is_dropped():
+    stream = BINARY_MESSAGE_HEADER.pack(BINARY_MESSAGE_MARKER, 1) + b"\xc1" + encode_message(MESSAGES[0])
+    assert MessageStreamDecoder().feed(stream) == [MESSAGES[0]]
+
+
+def test_msgpack_message_is_dropped_without_msgpack(monkeypatch):
+    monkeypatch.setattr(control_channel, "msgpack", None)
+    stream = BINARY_MESSAGE_HEADER.pack(BINARY_MESSAGE_MARKER, 3) + b"\x81\xa1a" + encode_message(MESSAGES[0])
+    assert MessageStreamDecoder().feed(stream) == [MESSAGES[0]]
+
+
+def test_negotiate_encoding(monkeypatch):
+    assert negotiate_encoding([]) == ENCODING_JSON
+    assert negotiate_encoding([ENCODING_JSON]) == ENCODING_JSON
+    monkeypatch.setattr(control_channel, "msgpack", None)
+    assert negotiate_encoding([ENCODING_MSGPACK, ENCODING_JSON]) == ENCODING_JSON
@@ -0,0 +1,109 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import socket
+
+import pytest
+
+from dispatcher.framing import (
+    FRAME_HEADER,
+    FRAME_PING,
+    FRAME_UMESSAGE,
+    FRAMING_PREAMBLE,
+    FrameDecoder,
+    FramingError,
+    ReceiveBuffer,
+    UpClientStream,
+    encode_frame,
+)
+
+PAYLOADS = [b"first", b"", b"x" * 1000, bytes(range(256))]
+
+
+def receive_frames(receive_buffer: ReceiveBuffer, sock: socket.socket):
+    receive_buffer.recv_into(sock)
+    return [(kind, bytes(payload)) for kind, payload in receive_buffer.frames()]
+
+
+def test_frame_decoder_decodes_merged_frames():
+    stream = b"".join(encode_frame(payload) for payload in PAYLOADS)
+    assert FrameDecoder().feed(stream) == [(FRAME_UMESSAGE, payload) for payload in PAYLOADS]
+
+
+def test_frame_decoder_reassembles_frames_split_at_every_byte():
+    decoder = FrameDecoder()
+    stream = b"".join(encode_frame(payload) for payload in PAYLOADS) + encode_frame(b"", FRAME_PING)
+    frames = []
+    for i in range(len(stream)):
+        frames += decoder.feed(stream[i : i + 1])
+    assert frames == [(FRAME_UMESSAGE, payload) for payload in PAYLOADS] + [(FRAME_PING, b"")]
+    assert decoder.buffer == bytearray()
+
+
+def test_frame_decoder_rejects_oversized_frames():
+    with pytest.raises(FramingError):
+        FrameDecoder(max_frame_length=10).feed(FRAME_HEADER.pack(11, FRAME_UMESSAGE))
+
+
+def test_up_client_stream_detects_framed_up_clients():
+    stream = UpClientStream()
+    assert stream.receive(FRAMING_PREAMBLE[:2]) == []
+    assert stream.framed is None
+    assert stream.receive(FRAMING_PREAMBLE[2:] + encode_frame(b"umsg")) == [(FRAME_UMESSAGE, b"umsg")]
+    assert stream.framed is True
+
+
+def test_up_client_stream_treats_each_legacy_recv_as_a_umessage():
+    stream = UpClientStream()
+    assert stream.receive(b"\x0a\x02hi") == [(FRAME_UMESSAGE, b"\x0a\x02hi")]
+    assert stream.receive(b"\x0a\x01x") == [(FRAME_UMESSAGE, b"\x0a\x01x")]
+    assert stream.framed is False
+
+
+def test_up_client_stream_rejects_invalid_preamble():
+    with pytest.raises(FramingError):
+        UpClientStream().receive(b"\x00BAD")
+
+
+def test_receive_buffer_parses_split_and_merged_frames():
+    receiver, sender = socket.socketpair()
+    with receiver, sender:
+        receive_buffer = ReceiveBuffer(capacity=64)
+        stream = b"".join(encode_frame(payload) for payload in PAYLOADS)
+        frames = []
+        # Frames split across reads, and larger than the buffer capacity, grow the buffer until consumed
+        for chunk in (stream[:3], stream[3:20], stream[20:]):
+            sender.sendall(chunk)
+            frames += receive_frames(receive_buffer, receiver)
+        while len(frames) < len(PAYLOADS):
+            frames += receive_frames(receive_buffer, receiver)
+        assert frames == [(FRAME_UMESSAGE, payload) for payload in PAYLOADS]
+
+        # Once the large frame is consumed, the buffer shrinks back to its capacity
+        sender.sendall(encode_frame(b"small"))
+        assert receive_frames(receive_buffer, receiver) == [(FRAME_UMESSAGE, b"small")]
+        assert len(receive_buffer.buffer) == 64
+
+
+def test_receive_buffer_rejects_oversized_frames():
+    receiver, sender = socket.socketpair()
+    with receiver, sender:
+        receive_buffer = ReceiveBuffer(max_frame_length=10)
+        sender.sendall(FRAME_HEADER.pack(11, FRAME_UMESSAGE))
+        receive_buffer.recv_into(receiver)
+        with pytest.raises(FramingError):
+            list(receive_buffer.frames())
@@ -0,0 +1,90 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import json
+
+import pytest
+
+from test_manager.metrics import (
+    METRICS_FORMAT_PROMETHEUS,
+    ROUND_TRIP,
+    SUB_BUCKET_COUNT,
+    LatencyHistogram,
+    LatencyMetrics,
+)
+
+# Relative width of the buckets above SUB_BUCKET_COUNT microseconds
+RELATIVE_PRECISION = 2 / SUB_BUCKET_COUNT
+
+
+@pytest.mark.parametrize("microseconds", [0, 1, SUB_BUCKET_COUNT - 1, SUB_BUCKET_COUNT, 1000, 123_456, 10**9])
+def test_bucket_holds_the_value(microseconds):
+    bucket = LatencyHistogram._bucket(microseconds)
+    highest = LatencyHistogram._highest_equivalent_value(bucket)
+    assert microseconds <= highest <= microseconds * (1 + RELATIVE_PRECISION)
+    # The next value past the bucket falls in the next bucket
+    assert LatencyHistogram._bucket(highest + 1) == bucket + 1
+
+
+def test_buckets_are_contiguous():
+    for microseconds in range(1, 100_000):
+        assert LatencyHistogram._bucket(microseconds) - LatencyHistogram._bucket(microseconds - 1) in (0, 1)
+
+
+def test_percentiles_within_precision():
+    histogram = LatencyHistogram()
+    # 1 ms to 1 s
+    latencies = [i / 1000 for i in range(1, 1001)]
+    for latency in latencies:
+        histogram.record(latency)
+    for percentile, expected in [(50.0, 0.5), (90.0, 0.9), (99.0, 0.99), (100.0, 1.0)]:
+        assert expected <= histogram.percentile(percentile) <= expected * (1 + RELATIVE_PRECISION)
+    assert histogram.percentile(0.0) == pytest.approx(0.001, rel=RELATIVE_PRECISION)
+
+    summary = histogram.summary()
+    assert summary["count"] == 1000
+    assert summary["min"] == 0.001
+    assert summary["max"] == 1.0
+    assert summary["mean"] == pytest.approx(0.5005)
+
+
+def test_empty_and_negative_latencies():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50.0) == 0.0
+    assert histogram.summary()["min"] == 0.0
+    histogram.record(-1.0)
+    assert histogram.percentile(99.0) == 0.0
+    assert histogram.min == 0.0
+
+
+def test_metrics_dump(tmp_path):
+    metrics = LatencyMetrics()
+    metrics.record(ROUND_TRIP, "python_socket", "send", 0.002)
+    metrics.record(ROUND_TRIP, "python_socket", "send", 0.004)
+    metrics.record(ROUND_TRIP, "java", "send", 0.010)
+
+    entries = json.loads(metrics.to_json())
+    assert [(entry["sdk"], entry["count"]) for entry in entries] == [("java", 1), ("python_socket", 2)]
+
+    path = tmp_path / "metrics.prom"
+    metrics.dump(str(path), METRICS_FORMAT_PROMETHEUS)
+    lines = path.read_text().splitlines()
+    assert lines[0] == "# TYPE uprotocol_tck_round_trip_seconds summary"
+    assert 'uprotocol_tck_round_trip_seconds_count{sdk="python_socket",action="send"} 2' in lines
+
+    with pytest.raises(ValueError):
+        metrics.dump(str(path), "csv")
@@ -0,0 +1,106 @@
+"""
+SPDX-FileCopyrightText: Copyright (c) 2024 Contributors to the Eclipse Foundation
+See the NOTICE file(s) distributed with this work for additional
+information regarding copyright ownership.
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+    http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+SPDX-FileType: SOURCE
+SPDX-License-Identifier: Apache-2.0
+"""
+
+import itertools
+
+from uprotocol.uri.factory.uri_factory import UriFactory
+from uprotocol.v1.uri_pb2 import UUri
+
+from dispatcher.routing import UriFilterIndex, filter_matches
+
+
+def uri(authority_name: str, ue_id: int, resource_id: int, ue_version_major: int = 1) -> UUri:
+    return UUri(authority_name=authority_name, ue_id=ue_id, ue_version_major=ue_version_major, resource_id=resource_id)
+
+
+TOPIC = uri("vehicle", 0x1234, 0x8001)
+OTHER_TOPIC = uri("vehicle", 0x1234, 0x8002)
+SINK = uri("cloud", 0x5678, 0)
+# Filters with every combination of concrete and wildcard components
+FILTERS = [
+    uri(authority, entity, resource, version)
+    for authority, entity, resource, version in itertools.product(
+        ("vehicle", "cloud", UriFactory.WILDCARD_AUTHORITY),
+        (0x1234, 0x5678, UriFactory.WILDCARD_ENTITY_ID),
+        (0x8001, 0, UriFactory.WILDCARD_RESOURCE_ID),
+        (1, UriFactory.WILDCARD_ENTITY_VERSION),
+    )
+]
+
+
+def test_lookup_matches_published_topic():
+    index = UriFilterIndex()
+    index.add(TOPIC, UriFactory.ANY, "exact")
+    index.add(uri("vehicle", 0x1234, UriFactory.WILDCARD_RESOURCE_ID), UriFactory.ANY, "any resource")
+    index.add(OTHER_TOPIC, UriFactory.ANY, "other topic")
+    assert sorted(index.lookup(TOPIC, UUri())) == ["any resource", "exact"]
+
+
+def test_lookup_matches_sink_when_source_is_any():
+    index = UriFilterIndex()
+    index.add(UriFactory.ANY, SINK, "sink")
+    assert index.lookup(TOPIC, SINK) == ["sink"]
+    assert index.lookup(SINK, TOPIC) == []
+
+
+def test_lookup_agrees_with_filter_matches():
+    # Every registration goes through the index, and its lookups must select what a linear scan would
+    registrations = [(source_filter, UriFactory.ANY) for source_filter in FILTERS]
+    registrations += [(UriFactory.ANY, sink_filter) for sink_filter in FILTERS]
+    registrations += [(source_filter, SINK) for source_filter in FILTERS[::5]]
+    index = UriFilterIndex()
+    for value, (source_filter, sink_filter) in enumerate(registrations):
+        index.add(source_filter, sink_filter, value)
+
+    for source, sink in [(TOPIC, UUri()), (TOPIC, SINK), (SINK, TOPIC), (OTHER_TOPIC, SINK)]:
+        expected = {
+            value
+            for value, (source_filter, sink_filter) in enumerate(registrations)
+            if filter_matches(source_filter, sink_filter, source, sink)
+        }
+        assert set(index.lookup(source, sink)) == expected
+
+
+def test_value_matched_by_several_filters_is_returned_once():
+    index = UriFilterIndex()
+    index.add(TOPIC, UriFactory.ANY, "listener")
+    index.add(uri(UriFactory.WILDCARD_AUTHORITY, 0x1234, 0x8001), UriFactory.ANY, "listener")
+    assert index.lookup(TOPIC, UUri()) == ["listener"]
+
+
+def test_add_and_remove_keep_count():
+    index = UriFilterIndex()
+    index.add(TOPIC, UriFactory.ANY, "listener")
+    index.add(TOPIC, UriFactory.ANY, "listener")
+    index.add(UriFactory.ANY, SINK, "listener")
+    assert len(index) == 2
+
+    assert index.remove(TOPIC, UriFactory.ANY, "listener")
+    assert not index.remove(TOPIC, UriFactory.ANY, "listener")
+    assert index.lookup(TOPIC, UUri()) == []
+    assert len(index) == 1
+
+
+def test_remove_value_unregisters_every_filter():
+    index = UriFilterIndex()
+    index.add(TOPIC, UriFactory.ANY, "closed")
+    index.add(UriFactory.ANY, SINK, "closed")
+    index.add(TOPIC, UriFactory.ANY, "open")
+    index.remove_value("closed")
+    assert index.lookup(TOPIC, SINK) == ["open"]
+    assert len(index) == 1
+    assert index.by_sink == {}
@@ -14,24 +14,51 @@ SPDX-License-Identifier: Apache-2.0
 
 import asyncio
 import logging
+import random
 import socket
 import threading
-from threading import Lock
-from typing import Dict, Tuple
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from threading import Condition, Lock
+from typing import Deque, Dict, List, Optional, Tuple
 
 from uprotocol.transport.ulistener import UListener
 from uprotocol.transport.utransport import UTransport
-from uprotocol.uri.factory.uri_factory import UriFactory
 from uprotocol.uri.serializer.uriserializer import UriSerializer
-from uprotocol.uri.validator.urivalidator import UriValidator
+from uprotocol.v1.uattributes_pb2 import UAttributes
 from uprotocol.v1.ucode_pb2 import UCode
 from uprotocol.v1.umessage_pb2 import UMessage
 from uprotocol.v1.uri_pb2 import UUri
 from uprotocol.v1.ustatus_pb2 import UStatus
 
+from dispatcher.endpoint import connect_to_endpoint, dispatcher_endpoint, enable_keepalive
+from dispatcher.framing import (
+    FRAME_PING,
+    FRAME_REGISTER_LISTENER,
+    FRAME_UMESSAGE,
+    FRAME_UNREGISTER_LISTENER,
+    FRAMING_PREAMBLE,
+    FramingError,
+    ReceiveBuffer,
+    encode_frame,
+)
+from dispatcher.routing import UriFilterIndex
+from dispatcher.tracing import Tracer
+
 logger = logging.getLogger(__name__)
-DISPATCHER_ADDR: tuple = ("127.0.0.1", 44444)
-BYTES_MSG_LENGTH: int = 32767
+tracer = Tracer("transport")
+# Upper bounds of the frames written with a single sendmsg() call, below the IOV_MAX of common platforms
+MAX_COALESCED_FRAMES: int = 64
+MAX_COALESCED_BYTES: int = 256 * 1024
+# Jittered exponential backoff between reconnection attempts, in seconds
+RECONNECT_INITIAL_DELAY: float = 0.1
+RECONNECT_MAX_DELAY: float = 5.0
+# A ping is sent after this many idle seconds, and the link is considered dead after missing three of them
+HEARTBEAT_INTERVAL: float = 5.0
+HEARTBEAT_MISSES: int = 3
+# Frames kept in the replay buffer are failed once the connection has been down for this many seconds
+REPLAY_TIMEOUT: float = 30.0
 
 
 def get_uuri_string(uri) -> str:
@@ -40,32 +67,71 @@ def get_uuri_string(uri) -> str:
     return UriSerializer.serialize(uri)
 
 
-def matches(source: str, sink: str, attributes):
-    if attributes is None:
-        return False
-    source = UriSerializer.deserialize(source)
-    sink = UriSerializer.deserialize(sink)
-    if source == UriFactory.ANY:
-        return UriValidator.matches(sink, attributes.sink)
-    elif sink == UriFactory.ANY:
-        return UriValidator.matches(source, attributes.source)
-    else:
-        return UriValidator.matches(source, attributes.source) and UriValidator.matches(sink, attributes.sink)
-
-
 class SocketUTransport(UTransport):
-    def __init__(self, source: UUri):
+    def __init__(
+        self,
+        source: UUri,
+        framed: bool = True,
+        endpoint: Optional[str] = None,
+        listener_executor: Optional[Executor] = None,
+        coalesce: bool = True,
+        reconnect: bool = True,
+        replay_buffer_size: int = 0,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+        replay_timeout: float = REPLAY_TIMEOUT,
+    ):
         """
         Creates a uEntity with Socket Connection, as well as a map of registered topics.
         param source: The URI associated with the UTransport.
+        param framed: Whether UMessages are exchanged with the Dispatcher as length-prefixed frames,
+        or as the legacy one-UMessage-per-recv byte stream.
+        param endpoint: The Dispatcher endpoint URI (tcp://, unix:// or unix://@ for an abstract socket),
+        by default the one from the UP_DISPATCHER_ENDPOINT environment variable, else the default TCP endpoint.
+        param listener_executor: Executor running synchronous listeners, so a slow one does not stall the receive
+        thread. By default they are called directly on the receive thread.
+        Coroutine listeners always run on the transport's own event loop thread.
+        param coalesce: Whether frames queued back-to-back are written together with one sendmsg() call.
+        Only applies to the framed wire mode, as legacy connections need one send per UMessage.
+        param reconnect: Whether to reconnect to the Dispatcher with jittered exponential backoff when the connection
+        drops, registering the listeners again.
+        param replay_buffer_size: How many outgoing frames are kept while disconnected, and written once reconnected.
+        By default, sending fails with UNAVAILABLE while disconnected.
+        param replay_timeout: Seconds after which the frames kept while disconnected fail with UNAVAILABLE,
+        as do the frames sent until the connection is restored. They fail at once when reconnection is disabled.
+        param heartbeat_interval: Idle seconds after which the Dispatcher is pinged, 0 to disable heartbeats.
+        Only applies to the framed wire mode.
         """
 
         self.source = source
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect(DISPATCHER_ADDR)
+        self.framed = framed
+        self.endpoint = dispatcher_endpoint(endpoint)
+        self.reconnect = reconnect
+        self.replay_buffer_size = replay_buffer_size
+        self.replay_timeout = replay_timeout
+        self.heartbeat_interval = heartbeat_interval if framed else 0
+        self.socket = self._connect()
+        self.connected = True
+        self.disconnected_since = 0.0
+        self.last_received = time.monotonic()
+        self.last_ping = 0.0
         self.uri_to_listener: Dict[Tuple[str, str], UListener] = {}
+        # Filters parsed once at registration, indexed by the (source_uri, sink_uri) keys of uri_to_listener
+        self.listener_index = UriFilterIndex()
         self.lock = Lock()
-        thread = threading.Thread(target=self.__listen)
+        # Outbound frames, drained by the writer thread, each with the future completed once it is written
+        self.outbound: Deque[Tuple[bytes, Future]] = deque()
+        self.outbound_ready = Condition()
+        self.coalesce = coalesce and framed
+        self.closed = False
+        self.writer_thread = threading.Thread(target=self.__write, daemon=True)
+        self.writer_thread.start()
+        self.listener_executor = listener_executor
+        # Long-lived event loop the coroutine listeners are scheduled on
+        self.listener_loop = asyncio.new_event_loop()
+        self.listener_loop_thread = threading.Thread(target=self.listener_loop.run_forever, daemon=True)
+        self.listener_loop_thread.start()
+        # Daemon thread, as with reconnection enabled it only ends once the transport is closed
+        thread = threading.Thread(target=self.__listen, daemon=True)
         thread.start()
 
     def __listen(self):
@@ -73,57 +139,297 @@ class SocketUTransport(UTransport):
         Listens to UMessages incoming from the Dispatcher.
         Handles incoming data if the Socket_UTransporter is registered to a UUri topic.
         """
-        while True:
+        # UMessages are parsed straight from the reused receive buffer, without copying them out
+        receive_buffer = ReceiveBuffer()
+        while not self.closed:
+            up_socket = self.socket
             try:
-                recv_data = self.socket.recv(BYTES_MSG_LENGTH)
-
-                if not recv_data or recv_data == b"":
-                    self.socket.close()
-                    return
-                umsg = UMessage()
-                umsg.ParseFromString(recv_data)
-                print('received message', umsg)
-                logger.info(f"{self.__class__.__name__} Received uMessage")
-                self._notify_listeners(umsg)
-
-            except socket.error as e:
-                logger.error(f"Socket error: {e}")
-                self.socket.close()
-                break
+                if receive_buffer.recv_into(up_socket) == 0:
+                    raise ConnectionResetError("Connection closed by the Dispatcher")
+                self.last_received = time.monotonic()
+                if self.framed:
+                    umsgs_serialized = (payload for kind, payload in receive_buffer.frames() if kind == FRAME_UMESSAGE)
+                else:
+                    umsgs_serialized = (receive_buffer.take(),)
+                for umsg_serialized in umsgs_serialized:
+                    # A UMessage that cannot be handled must not cost the following ones of the same read
+                    try:
+                        umsg = UMessage()
+                        umsg.ParseFromString(umsg_serialized)
+                        tracer.dump("Received UMessage %s", umsg_serialized)
+                        self._notify_listeners(umsg)
+                    except Exception as e:
+                        logger.error(f"Unable to handle received UMessage: {e}")
+
+            except (socket.error, FramingError) as e:
+                # An invalid frame leaves the stream desynchronized, so the connection is dropped like a failed socket
+                if self.closed:
+                    break
+                if self.connected:
+                    logger.error(f"Socket error: {e}")
+                self._link_lost(up_socket)
+                up_socket.close()
+                if not self.reconnect or not self._reconnect():
+                    break
+                receive_buffer = ReceiveBuffer()
             except Exception as e:
                 logger.error(f"Unexpected error: {e}")
 
+    def _connect(self) -> socket.socket:
+        """
+        Connects to the Dispatcher, with TCP keepalive enabled, and announces the wire mode.
+        """
+        up_socket: socket.socket = connect_to_endpoint(self.endpoint)
+        try:
+            enable_keepalive(up_socket)
+            if self.framed:
+                up_socket.sendall(FRAMING_PREAMBLE)
+        except OSError:
+            up_socket.close()
+            raise
+        return up_socket
+
+    def _link_lost(self, up_socket: socket.socket):
+        """
+        Marks the connection as lost, waking the receive thread up if it is still blocked on the socket.
+        Queued frames are failed unless they fit in the replay buffer.
+        """
+        with self.outbound_ready:
+            if up_socket is not self.socket or not self.connected:
+                return
+            self.connected = False
+            self.disconnected_since = time.monotonic()
+            dropped: List[Tuple[bytes, Future]] = self._trim_outbound()
+        self._fail_frames(dropped, "Socket connection lost")
+        try:
+            up_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _reconnect(self) -> bool:
+        """
+        Reconnects to the Dispatcher with jittered exponential backoff, then registers every listener again
+        before the frames queued in the meantime are written.
+
+        :return: False if the transport was closed before the connection was restored.
+        """
+        attempt = 0
+        while True:
+            delay: float = min(RECONNECT_MAX_DELAY, RECONNECT_INITIAL_DELAY * 2**attempt) * random.uniform(0.5, 1.0)
+            with self.outbound_ready:
+                if self.outbound_ready.wait_for(lambda: self.closed, timeout=delay):
+                    return False
+            attempt += 1
+            try:
+                up_socket: socket.socket = self._connect()
+                if self.framed:
+                    with self.lock:
+                        listener_keys: List[Tuple[str, str]] = list(self.uri_to_listener)
+                    for source_uri, sink_uri in listener_keys:
+                        filters = UAttributes(
+                            source=UriSerializer.deserialize(source_uri), sink=UriSerializer.deserialize(sink_uri)
+                        )
+                        up_socket.sendall(encode_frame(filters.SerializeToString(), FRAME_REGISTER_LISTENER))
+            except OSError as e:
+                tracer.info("Reconnection attempt %d to %s failed: %s", attempt, self.endpoint, e)
+                continue
+
+            with self.outbound_ready:
+                if self.closed:
+                    up_socket.close()
+                    return False
+                self.socket = up_socket
+                self.connected = True
+                self.last_received = time.monotonic()
+                self.outbound_ready.notify_all()
+            logger.info(f"{self.__class__.__name__} reconnected to {self.endpoint} after {attempt} attempts")
+            return True
+
+    def _trim_outbound(self) -> List[Tuple[bytes, Future]]:
+        """
+        Removes the oldest queued frames that do not fit in the replay buffer while disconnected,
+        and every queued frame once the connection is not expected back within the replay timeout.
+        Must be called holding outbound_ready.
+
+        :return: The removed frames and their futures.
+        """
+        replay_expired: bool = not self.reconnect or time.monotonic() - self.disconnected_since >= self.replay_timeout
+        kept: int = 0 if replay_expired else self.replay_buffer_size
+        dropped: List[Tuple[bytes, Future]] = []
+        while len(self.outbound) > kept:
+            dropped.append(self.outbound.popleft())
+        return dropped
+
+    @staticmethod
+    def _fail_frames(frames: List[Tuple[bytes, Future]], reason: str):
+        for _, future in frames:
+            if not future.done():
+                future.set_result(UStatus(code=UCode.UNAVAILABLE, message=reason))
+
     def _notify_listeners(self, umsg):
         """
         Notifies listeners registered to the given source and sink uri filters about the incoming message.
         """
 
+        attributes = umsg.attributes
         with self.lock:
-            is_match = False
-            for (source_uri, sink_uri), listener in self.uri_to_listener.items():
-                is_match = matches(source_uri, sink_uri, umsg.attributes)
-                if is_match and listener is not None:
-                    print('uri notify')
-                    logger.info(f"{self.__class__.__name__} Handle Uri")
-                    asyncio.run(listener.on_receive(umsg))
-            if not is_match:
-                print('uri not match')
-
-                logger.info(f"{self.__class__.__name__} Uri not found in Listener Map, discarding...")
+            matched: List[Tuple[Tuple[str, str], UListener]] = [
+                (key, self.uri_to_listener[key])
+                for key in self.listener_index.lookup(attributes.source, attributes.sink)
+            ]
+        if not matched:
+            tracer.debug("Uri not found in Listener Map, discarding...")
+        for (source_uri, sink_uri), listener in matched:
+            if listener is not None:
+                tracer.debug("Notifying listener for source %s sink %s", source_uri, sink_uri)
+                if self.listener_executor is not None and not asyncio.iscoroutinefunction(listener.on_receive):
+                    self.listener_executor.submit(self._invoke_listener, listener, umsg)
+                else:
+                    self._invoke_listener(listener, umsg)
+
+    def _invoke_listener(self, listener: UListener, umsg: UMessage):
+        """
+        Calls a listener, scheduling the coroutine returned by an async on_receive on the listener event loop.
+        """
+        try:
+            result = listener.on_receive(umsg)
+        except Exception as e:
+            logger.exception(f"Listener error: {e}")
+            return
+        if asyncio.iscoroutine(result):
+            future: Future = asyncio.run_coroutine_threadsafe(result, self.listener_loop)
+            future.add_done_callback(self._log_listener_error)
+
+    @staticmethod
+    def _log_listener_error(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Listener error: {future.exception()}")
 
     async def send(self, message: UMessage) -> UStatus:
         """
         Sends the provided UMessage over the socket connection.
+        The UMessage is queued for the writer thread, and the returned status tells whether it was written.
         """
         umsg_serialized: bytes = message.SerializeToString()
-        try:
-            print('send', message)
-            self.socket.sendall(umsg_serialized)
-            logger.info("uMessage Sent to dispatcher from python socket transport")
-        except OSError as e:
-            logger.exception(f"INTERNAL ERROR: {e}")
-            return UStatus(code=UCode.INTERNAL, message=f"INTERNAL ERROR: {e}")
-        return UStatus(code=UCode.OK, message="OK")
+        status: UStatus = await asyncio.wrap_future(
+            self._queue_frame(encode_frame(umsg_serialized) if self.framed else umsg_serialized)
+        )
+        if status.code == UCode.OK:
+            tracer.dump("Sent UMessage %s to dispatcher", umsg_serialized)
+        return status
+
+    def _queue_frame(self, frame: bytes) -> Future:
+        """
+        Queues an encoded frame for the writer thread.
+
+        :param frame: The encoded frame.
+        :return: A future resolving to the UStatus of the write.
+        """
+        future: Future = Future()
+        with self.outbound_ready:
+            if self.closed:
+                future.set_result(UStatus(code=UCode.UNAVAILABLE, message="Socket connection closed"))
+                return future
+            self.outbound.append((frame, future))
+            dropped: List[Tuple[bytes, Future]] = [] if self.connected else self._trim_outbound()
+            self.outbound_ready.notify()
+        self._fail_frames(dropped, "Socket connection lost")
+        return future
+
+    def __write(self):
+        """
+        Writes the queued frames to the Dispatcher, coalescing the frames queued back-to-back.
+        """
+        while True:
+            with self.outbound_ready:
+                self._check_heartbeat()
+                while not (self.connected and self.outbound) and not self.closed:
+                    if not self.connected:
+                        self._fail_frames(self._trim_outbound(), "Socket connection lost")
+                    if not self.outbound_ready.wait(timeout=self._writer_wait_timeout()):
+                        self._check_heartbeat()
+                if self.closed:
+                    break
+                up_socket: socket.socket = self.socket
+                batch: List[Tuple[bytes, Future]] = [self.outbound.popleft()]
+                batch_bytes: int = len(batch[0][0])
+                while (
+                    self.coalesce
+                    and self.outbound
+                    and len(batch) < MAX_COALESCED_FRAMES
+                    and batch_bytes + len(self.outbound[0][0]) <= MAX_COALESCED_BYTES
+                ):
+                    batch.append(self.outbound.popleft())
+                    batch_bytes += len(batch[-1][0])
+
+            try:
+                self._write_frames(up_socket, [frame for frame, _ in batch])
+            except OSError as e:
+                logger.error(f"INTERNAL ERROR: {e}")
+                if self.replay_buffer_size:
+                    # Written again once reconnected, if they fit in the replay buffer
+                    with self.outbound_ready:
+                        self.outbound.extendleft(reversed(batch))
+                else:
+                    for _, future in batch:
+                        future.set_result(UStatus(code=UCode.INTERNAL, message=f"INTERNAL ERROR: {e}"))
+                self._link_lost(up_socket)
+                continue
+            for _, future in batch:
+                future.set_result(UStatus(code=UCode.OK, message="OK"))
+
+        # Fail the frames still queued when the transport was closed
+        with self.outbound_ready:
+            pending, self.outbound = self.outbound, deque()
+        self._fail_frames(list(pending), "Socket connection closed")
+
+    def _writer_wait_timeout(self) -> Optional[float]:
+        """
+        Returns how long the writer thread waits for frames: until the next heartbeat check,
+        or until the replay timeout expires for the frames queued while disconnected.
+        Must be called holding outbound_ready.
+        """
+        timeouts: List[float] = [self.heartbeat_interval] if self.heartbeat_interval else []
+        if not self.connected and self.outbound:
+            timeouts.append(max(0.0, self.disconnected_since + self.replay_timeout - time.monotonic()))
+        return min(timeouts, default=None)
+
+    def _check_heartbeat(self):
+        """
+        Pings the Dispatcher when the connection has been idle for a heartbeat interval,
+        and drops the connection when nothing was received for HEARTBEAT_MISSES intervals.
+        Must be called holding outbound_ready.
+        """
+        if not self.heartbeat_interval or not self.connected:
+            return
+        now: float = time.monotonic()
+        idle: float = now - self.last_received
+        if idle > HEARTBEAT_MISSES * self.heartbeat_interval:
+            logger.error(f"No heartbeat from the Dispatcher for {idle:.1f}s, dropping the connection")
+            self._link_lost(self.socket)
+        elif idle >= self.heartbeat_interval and now - self.last_ping >= self.heartbeat_interval:
+            self.last_ping = now
+            self.outbound.append((encode_frame(b"", FRAME_PING), Future()))
+
+    @staticmethod
+    def _write_frames(up_socket: socket.socket, frames: List[bytes]):
+        """
+        Writes frames with as few system calls as possible: one sendmsg() for all of them where available.
+        """
+        if len(frames) == 1:
+            up_socket.sendall(frames[0])
+        elif hasattr(up_socket, "sendmsg"):
+            buffers: List[memoryview] = [memoryview(frame) for frame in frames]
+            while buffers:
+                sent: int = up_socket.sendmsg(buffers)
+                while sent:
+                    if sent >= len(buffers[0]):
+                        sent -= len(buffers.pop(0))
+                    else:
+                        buffers[0] = buffers[0][sent:]
+                        sent = 0
+        else:
+            up_socket.sendall(b"".join(frames))
 
     async def register_listener(self, source_filter: UUri, listener: UListener, sink_filer: UUri = None) -> UStatus:
         """
@@ -131,9 +437,12 @@ class SocketUTransport(UTransport):
         """
         source_uri = get_uuri_string(source_filter)
         sink_uri = get_uuri_string(sink_filer)
-        print('listeners', source_uri, sink_uri, listener)
-        self.uri_to_listener[source_uri, sink_uri] = listener
-        return UStatus(code=UCode.OK, message="OK")
+        tracer.info("Registering listener for source %s sink %s", source_uri, sink_uri)
+        filters = UAttributes(source=UriSerializer.deserialize(source_uri), sink=UriSerializer.deserialize(sink_uri))
+        with self.lock:
+            self.uri_to_listener[source_uri, sink_uri] = listener
+            self.listener_index.add(filters.source, filters.sink, (source_uri, sink_uri))
+        return await self._announce_listener_filters(FRAME_REGISTER_LISTENER, filters)
 
     async def unregister_listener(self, source_filter: UUri, listener: UListener, sink_filer: UUri = None) -> UStatus:
         """
@@ -143,12 +452,23 @@ class SocketUTransport(UTransport):
         source_uri = get_uuri_string(source_filter)
         sink_uri = get_uuri_string(sink_filer)
 
-        listener = self.uri_to_listener.pop((source_uri, sink_uri), None)
+        filters = UAttributes(source=UriSerializer.deserialize(source_uri), sink=UriSerializer.deserialize(sink_uri))
+        with self.lock:
+            listener = self.uri_to_listener.pop((source_uri, sink_uri), None)
+            self.listener_index.remove(filters.source, filters.sink, (source_uri, sink_uri))
         if listener:
-            return UStatus(code=UCode.OK, message="OK")
+            return await self._announce_listener_filters(FRAME_UNREGISTER_LISTENER, filters)
         else:
             return UStatus(code=UCode.NOT_FOUND, message="Listener not found for the given UUri")
 
+    async def _announce_listener_filters(self, kind: int, filters: UAttributes) -> UStatus:
+        """
+        Tells the Dispatcher which messages to route to this transport, when using the framed wire mode.
+        """
+        if not self.framed:
+            return UStatus(code=UCode.OK, message="OK")
+        return await asyncio.wrap_future(self._queue_frame(encode_frame(filters.SerializeToString(), kind)))
+
     def get_source(self) -> UUri:
         """
         Returns the source URI of the UTransport.
@@ -157,7 +477,23 @@ class SocketUTransport(UTransport):
 
     def close(self):
         """
-        Closes the socket connection.
+        Closes the socket connection and stops the writer thread and the listener event loop.
+        Frames still queued are not written.
         """
+        with self.outbound_ready:
+            self.closed = True
+            self.outbound_ready.notify_all()
+        try:
+            # Wakes the receive thread up, which close() alone does not guarantee
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
         self.socket.close()
+        if threading.current_thread() is self.listener_loop_thread:
+            # Closed from a listener coroutine: the loop stops once it returns
+            self.listener_loop.stop()
+        elif not self.listener_loop.is_closed():
+            self.listener_loop.call_soon_threadsafe(self.listener_loop.stop)
+            self.listener_loop_thread.join()
+            self.listener_loop.close()
         logger.info(f"{self.__class__.__name__} Socket Connection Closed")